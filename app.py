@@ -1,20 +1,32 @@
-from flask import Flask, jsonify, request, session, render_template, send_from_directory
+from flask import Flask, jsonify, request, session, render_template, send_from_directory, g, Response
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 # Import firebase admin components defensively (guard against ImportError in serverless)
 try:
     import firebase_admin
-    from firebase_admin import credentials, firestore
+    from firebase_admin import credentials, firestore, auth as firebase_auth
 except Exception as e:
     firebase_admin = None
     credentials = None
     firestore = None
+    firebase_auth = None
     print(f"⚠️ Warning: firebase_admin import failed: {e}")
 import os
 from dotenv import load_dotenv
-import hashlib
 import secrets
 from datetime import datetime, timedelta
 from functools import wraps
+from invoice_numbers import InvoiceNumberAllocator, parse_invoice_date
+from idempotency import IdempotencyStore, IdempotencyConflict, MAX_KEY_LENGTH
+from archive import archive_old_records, load_archived, load_rollups
+from rate_limit import AdmissionController
+from json_provider import FastJSONProvider
+from profiling import RequestProfiling, PROFILE_HEADER
+from reports import AgingReport, gst_summary, load_invoices_between, iter_csv
+from organizations import DEFAULT_ORG_ID, org_of, user_org, valid_org_id
+from blocklist import BlockedEmails
+from passwords import hash_password, verify_password, needs_rehash, dummy_hash, HasherBusy
+from result_cache import ResultCache, cache_backend_from_env, encode_response, decode_response
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +38,13 @@ app = Flask(
     static_url_path='/static',
     template_folder='templates'
 )
+# Compact orjson-backed JSON with ISO 8601 datetimes for API responses
+app.json = FastJSONProvider(app)
+# Behind N trusted proxies, take the client address from the entry the nearest proxy added to
+# X-Forwarded-For; entries further left are client-controlled. 0 (default) uses the socket address.
+_trusted_proxies = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+if _trusted_proxies > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_trusted_proxies)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here-change-in-production')
 # Use Flask's built-in session (signed cookies) - works on Vercel serverless
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
@@ -37,7 +56,7 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 CORS(app, 
      supports_credentials=True,
      origins=["http://localhost:5000", "http://127.0.0.1:5000"],
-     allow_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "Idempotency-Key", PROFILE_HEADER],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 # Initialize Firebase safely (don't crash import-time if credentials are missing)
@@ -72,11 +91,63 @@ except Exception as e:
     db = None
     firebase_initialized = False
 
+# Server-side invoice numbering (sequential per financial year)
+invoice_numbers = InvoiceNumberAllocator(db) if db is not None else None
+# Idempotency-Key records for create endpoints (retries return the original response)
+idempotency = IdempotencyStore(db) if db is not None else None
+
+# Token-bucket rate limits and a concurrency cap for the auth endpoints
+auth_admission = AdmissionController()
+
+# Receivables aging summaries, updated by the invoice endpoints in their own transactions
+aging_report = AgingReport(db) if db is not None else None
+
+# Blocked emails held in memory and checked on signup/login without a per-request read
+blocked_emails = BlockedEmails(db) if db is not None else None
+if blocked_emails is not None:
+    try:
+        blocked_emails.load()
+    except Exception as e:
+        print(f"⚠️ Could not load blocked emails at startup (will retry on first check): {e}")
+
+# List and report responses shared across instances, invalidated by the write endpoints
+_result_cache_backend = cache_backend_from_env()
+result_cache = ResultCache(_result_cache_backend) if _result_cache_backend is not None else None
+
 # Helper response when DB not configured
 
 def require_db_response():
     return jsonify({'error': 'Backend not configured: missing Firebase credentials'}), 503
 
+# On-demand profiling: signed X-Profile-Request header or 1-in-N sampling
+request_profiling = RequestProfiling(app.config['SECRET_KEY'])
+
+@app.before_request
+def start_profiling():
+    if request_profiling.should_profile(request.headers):
+        g.profiling = request_profiling.start()
+
+@app.after_request
+def finish_profiling(response):
+    running = g.pop('profiling', None)
+    if running is not None:
+        summary = request_profiling.finish(running, {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code
+        })
+        response.headers['X-Profile-Id'] = summary['name']
+    return response
+
+@app.teardown_request
+def abort_profiling(exc):
+    # after_request is skipped when the view raised; still stop the profiler
+    running = g.pop('profiling', None)
+    if running is not None:
+        request_profiling.finish(running, {'method': request.method, 'path': request.path,
+                                           'endpoint': request.endpoint, 'status': 500})
+
 # Health check
 @app.route('/health')
 def health_check():
@@ -151,34 +222,192 @@ def admin_required(f):
             return jsonify({'error': 'Authorization check failed'}), 500
     return decorated_function
 
+def bearer_user_doc():
+    """
+    Users document of the Firebase ID token sent as 'Authorization: Bearer <token>'
+    by the dashboard, which signs in with Firebase Auth rather than /api/auth/login
+    """
+    header = request.headers.get('Authorization', '')
+    if firebase_auth is None or not header.startswith('Bearer '):
+        return None
+    try:
+        claims = firebase_auth.verify_id_token(header[len('Bearer '):])
+    except Exception as e:
+        print(f"DEBUG: Rejected bearer token: {e}")  # Debug line
+        return None
+    email = claims.get('email')
+    if not email:
+        return None
+    user_docs = list(db.collection('users').where('email', '==', email).limit(1).stream())
+    return user_docs[0] if user_docs else None
+
 def approved_user_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not firebase_initialized:
             return jsonify({'error': 'Backend not configured: missing Firebase credentials'}), 503
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-        
-        user_ref = db.collection('users').document(session['user_id'])
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            session.clear()
-            return jsonify({'error': 'User not found'}), 404
+        if 'user_id' in session:
+            user_doc = db.collection('users').document(session['user_id']).get()
+            if not user_doc.exists:
+                session.clear()
+                return jsonify({'error': 'User not found'}), 404
+        else:
+            user_doc = bearer_user_doc()
+            if user_doc is None:
+                return jsonify({'error': 'Authentication required'}), 401
         
         user_data = user_doc.to_dict()
         if user_data.get('status') != 'approved':
             return jsonify({'error': 'Account not approved', 'status': user_data.get('status')}), 403
         
+        g.user_id = user_doc.id
+        # Every data endpoint is scoped to the user's organization
+        g.org_id = user_org(user_data)
+        if g.org_id is None:
+            return jsonify({'error': 'Account is not assigned to an organization yet'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
-# Utility Functions
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def idempotent_create(f):
+    """
+    Replay the stored response when a create request is retried with the same
+    Idempotency-Key header. The wrapped view receives the key record id (or None
+    when the header is absent) and must pass it to save_created().
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if not key:
+            return f(None, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
+
+        record_id = idempotency.record_id(request.path, g.user_id, key)
+        try:
+            replay = idempotency.replay(record_id, request.get_json() or {})
+        except IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), 422
+        if replay is not None:
+            body, status = replay
+            return jsonify(body), status, {'Idempotent-Replayed': 'true'}
+        return f(record_id, *args, **kwargs)
+    return decorated_function
+
+def save_created(record_id, request_data, doc_ref, prepare):
+    """
+    Write the document built by prepare(transaction) -> (document, body) in one
+    transaction, together with the idempotency key record when present.
+    Returns (response, document); document is None when nothing was written
+    (a replay or a key conflict).
+    """
+    if record_id is None:
+        @firestore.transactional
+        def write(transaction):
+            document, body = prepare(transaction)
+            transaction.set(doc_ref, document)
+            return document, body
+
+        document, body = write(db.transaction())
+        return jsonify(body), document
+    try:
+        body, status, document = idempotency.commit(record_id, request_data, doc_ref, prepare)
+    except IdempotencyConflict as e:
+        return (jsonify({'error': str(e)}), 422), None
+    if document is None:
+        return (jsonify(body), status, {'Idempotent-Replayed': 'true'}), None
+    return (jsonify(body), status), document
+
+def date_range_args():
+    """Optional ?from=YYYY-MM-DD&to=YYYY-MM-DD filter; raises ValueError on bad dates"""
+    date_from = request.args.get('from') or None
+    date_to = request.args.get('to') or None
+    for value in (date_from, date_to):
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+    return date_from, date_to
+
+def list_collection(name):
+    """
+    Hot documents of a collection, filtered by the request's date range. Archived
+    documents are only read when the request asks for a range that includes them.
+    """
+    try:
+        date_from, date_to = date_range_args()
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+
+    query = db.collection(name).where('orgId', '==', g.org_id)
+    if date_from:
+        query = query.where('date', '>=', date_from)
+    if date_to:
+        query = query.where('date', '<=', date_to)
+
+    results = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        data['id'] = doc.id
+        results.append(data)
+    if date_from:
+        date_to = date_to or datetime.now().strftime('%Y-%m-%d')
+        results.extend(load_archived(db, name, date_from, date_to, g.org_id))
+    return jsonify(results)
+
+def cached_response(*collections):
+    """
+    Serve a GET view from the result cache, keyed by path, query string,
+    organization and the versions of the collections it reads. Only 200
+    responses are cached.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if result_cache is None:
+                return f(*args, **kwargs)
+            uncached = {}
+
+            def compute():
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    uncached['response'] = response
+                    return None
+                return encode_response(response)
 
-def verify_password(password, hashed):
-    return hashlib.sha256(password.encode()).hexdigest() == hashed
+            parts = (request.path, sorted(request.args.items(multi=True)))
+            value, hit = result_cache.get_or_compute(collections, g.org_id, parts, compute)
+            if value is None:
+                return uncached['response']
+            response = decode_response(value)
+            response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return decorated_function
+    return decorator
+
+def invalidate_results(*collections, org_id=None):
+    """Stop serving cached results that read these collections (for one organization, or all)"""
+    if result_cache is not None:
+        result_cache.invalidate(collections, org_id or '*')
+
+def client_ip():
+    # ProxyFix has already replaced remote_addr when RATE_LIMIT_TRUSTED_PROXIES is set
+    return request.remote_addr
+
+def admission_controlled(f):
+    """Reject with 429 before touching Firestore when limits are exceeded or all slots are busy"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        email = str(data.get('email', '')).strip().lower()
+        rejected = auth_admission.check(client_ip(), email)
+        if rejected:
+            reason, retry_after = rejected
+            return jsonify({'error': reason}), 429, {'Retry-After': str(max(1, int(retry_after + 0.999)))}
+        if not auth_admission.acquire():
+            return jsonify({'error': 'Server busy, please retry'}), 429, {'Retry-After': '1'}
+        try:
+            return f(*args, **kwargs)
+        finally:
+            auth_admission.release()
+    return decorated_function
 
 # Initialize admin user if it doesn't exist (env-driven)
 # Set ADMIN_EMAIL and ADMIN_PASSWORD in environment to enable creation
@@ -207,6 +436,7 @@ def init_admin_user():
                 'password': hash_password(admin_password),
                 'status': 'approved',
                 'role': 'Admin',
+                'orgId': DEFAULT_ORG_ID,
                 'createdAt': datetime.now(),
                 'lastLogin': None
             }
@@ -231,6 +461,7 @@ def serve_admin_setup():
 
 # Authentication Routes
 @app.route('/api/auth/signup', methods=['POST'])
+@admission_controlled
 def signup():
     try:
         if not firebase_initialized:
@@ -243,6 +474,9 @@ def signup():
         # Validate input
         if not all([email, password]):
             return jsonify({'error': 'Email and password are required'}), 400
+
+        if blocked_emails.is_blocked(email):
+            return jsonify({'error': 'This email address has been blocked'}), 403
         
         # Check if user already exists
         users_ref = db.collection('users')
@@ -257,6 +491,8 @@ def signup():
             'password': hash_password(password),
             'status': 'pending',
             'role': 'User',
+            # No organization (and no data access) until an admin assigns one
+            'orgId': None,
             'createdAt': datetime.now(),
             'lastLogin': None
         }
@@ -270,10 +506,13 @@ def signup():
             'status': 'pending'
         }), 201
         
+    except HasherBusy as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/auth/login', methods=['POST'])
+@admission_controlled
 def login():
     try:
         if not firebase_initialized:
@@ -285,24 +524,36 @@ def login():
         
         if not all([email, password]):
             return jsonify({'error': 'Email and password are required'}), 400
+
+        if blocked_emails.is_blocked(email):
+            return jsonify({'error': 'This email address has been blocked'}), 403
         
         # Find user
         users_ref = db.collection('users')
         user_docs = list(users_ref.where('email', '==', email).stream())
         
         if not user_docs:
+            # Pay for a hash anyway, so response times don't tell which emails have accounts
+            verify_password(password, dummy_hash())
             return jsonify({'error': 'Invalid email or password'}), 401
         
         user_doc = user_docs[0]
         user_data = user_doc.to_dict()
         user_id = user_doc.id
         
-        # Verify password
-        if not verify_password(password, user_data['password']):
+        # Verify password (accounts without a stored hash, e.g. Firebase Auth signups, can't log in here)
+        stored_hash = user_data.get('password')
+        if not isinstance(stored_hash, str):
+            verify_password(password, dummy_hash())
+            return jsonify({'error': 'Invalid email or password'}), 401
+        if not verify_password(password, stored_hash):
             return jsonify({'error': 'Invalid email or password'}), 401
         
-        # Update last login
-        users_ref.document(user_id).update({'lastLogin': datetime.now()})
+        # Update last login, upgrading legacy or outdated password hashes while we have the plaintext
+        updates = {'lastLogin': datetime.now()}
+        if needs_rehash(stored_hash):
+            updates['password'] = hash_password(password)
+        users_ref.document(user_id).update(updates)
         
         # Create session
         session['user_id'] = user_id
@@ -324,6 +575,8 @@ def login():
             }
         }), 200
         
+    except HasherBusy as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -354,7 +607,8 @@ def get_current_user():
                 'name': user_data.get('name'),
                 'email': user_data.get('email'),
                 'role': user_data.get('role'),
-                'status': user_data.get('status')
+                'status': user_data.get('status'),
+                'orgId': user_org(user_data)
             }
         }), 200
         
@@ -390,6 +644,7 @@ def get_all_users():
                 'email': user_data.get('email'),
                 'role': user_data.get('role', 'User'),
                 'status': user_data.get('status', 'pending'),
+                'orgId': user_org(user_data),
                 'createdAt': user_data.get('createdAt'),
                 'lastLogin': user_data.get('lastLogin')
             })
@@ -456,6 +711,29 @@ def update_user_role(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/users/<user_id>/organization', methods=['PUT'])
+@admin_required
+def update_user_organization(user_id):
+    try:
+        data = request.get_json()
+        org_id = (data.get('orgId') or '').strip()
+        
+        if not valid_org_id(org_id):
+            return jsonify({'error': 'Invalid organization id'}), 400
+        
+        user_ref = db.collection('users').document(user_id)
+        user_doc = user_ref.get()
+        
+        if not user_doc.exists:
+            return jsonify({'error': 'User not found'}), 404
+        
+        user_ref.update({'orgId': org_id})
+        
+        return jsonify({'message': f'User moved to organization {org_id}'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/admin/users/<user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(user_id):
@@ -473,6 +751,161 @@ def delete_user(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Bulk user actions: one get_all for every target, then chunked batch commits
+USER_BATCH_ACTIONS = ['approve', 'reject', 'role', 'organization', 'delete']
+MAX_USER_BATCH = 2000
+WRITE_BATCH_SIZE = 500
+
+@app.route('/api/admin/users:batch', methods=['POST'])
+@admin_required
+def batch_user_actions():
+    try:
+        data = request.get_json(silent=True) or {}
+        actions = data.get('actions') if isinstance(data, dict) else data
+        if not isinstance(actions, list) or not actions:
+            return jsonify({'error': 'actions must be a non-empty list'}), 400
+        if len(actions) > MAX_USER_BATCH:
+            return jsonify({'error': f'At most {MAX_USER_BATCH} actions per request'}), 400
+
+        # Validate every entry first so nothing is written for malformed requests
+        results = []
+        planned = []
+        seen = set()
+        for entry in actions:
+            entry = entry if isinstance(entry, dict) else {}
+            user_id = entry.get('user_id')
+            action = entry.get('action')
+            result = {'user_id': user_id, 'action': action}
+            results.append(result)
+            if not isinstance(user_id, str) or not user_id or action not in USER_BATCH_ACTIONS:
+                result['error'] = 'user_id and a valid action are required'
+            elif user_id in seen:
+                result['error'] = 'Duplicate user_id in request'
+            elif action == 'role' and entry.get('role') not in ['Admin', 'Manager', 'User']:
+                result['error'] = 'Invalid role'
+            elif action == 'organization' and not valid_org_id((entry.get('orgId') or '').strip()):
+                result['error'] = 'Invalid organization id'
+            else:
+                seen.add(user_id)
+                planned.append((result, entry))
+
+        users_ref = db.collection('users')
+        refs = [users_ref.document(e['user_id']) for _, e in planned]
+        snapshots = {doc.id: doc for doc in db.get_all(refs)} if refs else {}
+
+        def commit(batch, pending):
+            # Chunks commit independently, so a failed chunk is reported on its own entries
+            # while the ones already committed stay reported as applied
+            try:
+                batch.commit()
+            except Exception as e:
+                for failed in pending:
+                    failed['error'] = f'Commit failed: {e}'
+                return
+            for committed in pending:
+                committed['ok'] = True
+
+        batch = db.batch()
+        pending = []
+        for result, entry in planned:
+            snapshot = snapshots.get(entry['user_id'])
+            if snapshot is None or not snapshot.exists:
+                result['error'] = 'User not found'
+                continue
+            action = entry['action']
+            if action == 'delete':
+                batch.delete(snapshot.reference)
+            elif action == 'approve':
+                batch.update(snapshot.reference, {'status': 'approved'})
+            elif action == 'reject':
+                batch.update(snapshot.reference, {'status': 'rejected'})
+            elif action == 'role':
+                batch.update(snapshot.reference, {'role': entry['role']})
+            else:
+                batch.update(snapshot.reference, {'orgId': entry['orgId'].strip()})
+            pending.append(result)
+            if len(pending) == WRITE_BATCH_SIZE:
+                commit(batch, pending)
+                batch, pending = db.batch(), []
+        if pending:
+            commit(batch, pending)
+
+        for result in results:
+            result.setdefault('ok', False)
+        succeeded = sum(1 for r in results if r['ok'])
+        return jsonify({'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/rate-limit/metrics', methods=['GET'])
+@admin_required
+def get_rate_limit_metrics():
+    return jsonify(auth_admission.metrics()), 200
+
+@app.route('/api/admin/cache/metrics', methods=['GET'])
+@admin_required
+def get_result_cache_metrics():
+    if result_cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(result_cache.metrics(), enabled=True)), 200
+
+@app.route('/api/admin/profiles/token', methods=['POST'])
+@admin_required
+def issue_profile_token():
+    data = request.get_json(silent=True) or {}
+    ttl_seconds = min(int(data.get('ttlSeconds', 600)), 3600)
+    return jsonify({'header': PROFILE_HEADER, 'value': request_profiling.issue_token(ttl_seconds),
+                    'expiresIn': ttl_seconds}), 200
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    return jsonify(request_profiling.store.list()), 200
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    return send_from_directory(request_profiling.store.directory, f'{name}.collapsed',
+                               mimetype='text/plain', as_attachment=True)
+
+@app.route('/api/admin/archive', methods=['POST'])
+@admin_required
+def run_archive():
+    try:
+        data = request.get_json(silent=True) or {}
+        stats = archive_old_records(
+            db,
+            older_than_days=data.get('olderThanDays'),
+            limit=data.get('limit'),
+            dry_run=bool(data.get('dryRun'))
+        )
+        if not stats['dryRun']:
+            # Archiving moves records of every organization
+            invalidate_results('invoices', 'transactions', 'archive')
+        return jsonify(stats), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/block-email', methods=['POST'])
+@admin_required
+def block_email():
+    try:
+        data = request.get_json()
+        email = data.get('email', '').strip().lower()
+
+        if not email:
+            return jsonify({'error': 'Email is required'}), 400
+
+        # Writes blocked_emails and bumps the blocklist version; this instance's set updates immediately
+        blocked_emails.block(email)
+
+        return jsonify({'message': f'Email {email} blocked successfully'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/admin/unblock-email', methods=['POST'])
 @admin_required
 def unblock_email():
@@ -483,10 +916,8 @@ def unblock_email():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
         
-        # Remove from blocked_emails collection
-        blocked_emails = db.collection('blocked_emails').where('email', '==', email).stream()
-        for doc in blocked_emails:
-            doc.reference.delete()
+        # Remove from blocked_emails collection and the in-memory set
+        blocked_emails.unblock(email)
         
         # Add to unblocked_emails collection
         db.collection('unblocked_emails').add({
@@ -503,28 +934,46 @@ def unblock_email():
 # API Routes (Protected)
 @app.route('/api/invoices', methods=['GET'])
 @approved_user_required
+@cached_response('invoices', 'archive')
 def get_invoices():
     try:
-        invoices_ref = db.collection('invoices')
-        docs = invoices_ref.stream()
-        invoices = []
-        for doc in docs:
-            invoice_data = doc.to_dict()
-            invoice_data['id'] = doc.id
-            invoices.append(invoice_data)
-        return jsonify(invoices)
+        return list_collection('invoices')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/invoices', methods=['POST'])
 @approved_user_required
-def create_invoice():
+@idempotent_create
+def create_invoice(idempotency_record):
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         # Add validation as needed
+        invoice_date = parse_invoice_date(data.get('date'))
+        org_id, user_id = g.org_id, g.user_id
+        # Block numbering hands numbers out before the write; gap-free numbering takes one inside it
+        preallocated = None if invoice_numbers.gap_free else invoice_numbers.allocate(invoice_date, org_id)
         doc_ref = db.collection('invoices').document()
-        doc_ref.set(data)
-        return jsonify({'id': doc_ref.id, 'message': 'Invoice created successfully'})
+
+        def prepare(transaction):
+            # Reads first: the aging summary, then the counter (which next_in_transaction also writes)
+            aging_entries = aging_report.read(transaction, org_id)
+            invoice_number, financial_year = (
+                preallocated or invoice_numbers.next_in_transaction(transaction, invoice_date, org_id))
+            invoice = dict(data, invoiceNumber=invoice_number, financialYear=financial_year,
+                           createdBy=user_id, orgId=org_id, createdAt=datetime.now())
+            aging_report.record(transaction, org_id, aging_entries, None, invoice)
+            return invoice, {
+                'id': doc_ref.id,
+                'invoiceNumber': invoice_number,
+                'financialYear': financial_year,
+                'message': 'Invoice created successfully'
+            }
+
+        response, invoice = save_created(idempotency_record, data, doc_ref, prepare)
+        # Replays and key conflicts wrote nothing, so there's nothing to invalidate
+        if invoice is not None:
+            invalidate_results('invoices', org_id=g.org_id)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -532,9 +981,28 @@ def create_invoice():
 @approved_user_required
 def update_invoice(invoice_id):
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
+        # Ownership fields can't be changed through an update
+        for field in ('orgId', 'createdBy', 'invoiceNumber', 'financialYear'):
+            data.pop(field, None)
+        org_id = g.org_id
         doc_ref = db.collection('invoices').document(invoice_id)
-        doc_ref.update(data)
+
+        # Status, due date or amount changes move the invoice within the aging summary in the same write
+        @firestore.transactional
+        def write(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists or org_of(snapshot.to_dict()) != org_id:
+                return False
+            invoice = snapshot.to_dict()
+            aging_entries = aging_report.read(transaction, org_id)
+            transaction.update(doc_ref, data)
+            aging_report.record(transaction, org_id, aging_entries, invoice, dict(invoice, **data))
+            return True
+
+        if not write(db.transaction()):
+            return jsonify({'error': 'Invoice not found'}), 404
+        invalidate_results('invoices', org_id=org_id)
         return jsonify({'message': 'Invoice updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -543,34 +1011,90 @@ def update_invoice(invoice_id):
 @approved_user_required
 def delete_invoice(invoice_id):
     try:
-        db.collection('invoices').document(invoice_id).delete()
+        org_id = g.org_id
+        doc_ref = db.collection('invoices').document(invoice_id)
+
+        @firestore.transactional
+        def write(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists or org_of(snapshot.to_dict()) != org_id:
+                return False
+            aging_entries = aging_report.read(transaction, org_id)
+            transaction.delete(doc_ref)
+            aging_report.record(transaction, org_id, aging_entries, snapshot.to_dict(), None)
+            return True
+
+        if not write(db.transaction()):
+            return jsonify({'error': 'Invoice not found'}), 404
+        invalidate_results('invoices', org_id=org_id)
         return jsonify({'message': 'Invoice deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/transactions', methods=['GET'])
 @approved_user_required
+@cached_response('transactions', 'archive')
 def get_transactions():
     try:
-        transactions_ref = db.collection('transactions')
-        docs = transactions_ref.stream()
-        transactions = []
-        for doc in docs:
-            transaction_data = doc.to_dict()
-            transaction_data['id'] = doc.id
-            transactions.append(transaction_data)
-        return jsonify(transactions)
+        return list_collection('transactions')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/transactions', methods=['POST'])
 @approved_user_required
-def create_transaction():
+@idempotent_create
+def create_transaction(idempotency_record):
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         doc_ref = db.collection('transactions').document()
-        doc_ref.set(data)
-        return jsonify({'id': doc_ref.id, 'message': 'Transaction created successfully'})
+        transaction = dict(data, createdBy=g.user_id, orgId=g.org_id)
+        response, written = save_created(idempotency_record, data, doc_ref, lambda _: (
+            transaction, {'id': doc_ref.id, 'message': 'Transaction created successfully'}))
+        if written is not None:
+            invalidate_results('transactions', org_id=g.org_id)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/archive/rollups', methods=['GET'])
+@approved_user_required
+@cached_response('archive')
+def get_archive_rollups():
+    try:
+        try:
+            date_from, date_to = date_range_args()
+        except ValueError:
+            return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+        return jsonify(load_rollups(db, g.org_id, date_from, date_to))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reports/aging', methods=['GET'])
+@approved_user_required
+def get_aging_report():
+    try:
+        return jsonify(aging_report.build(g.org_id)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reports/gst-summary', methods=['GET'])
+@approved_user_required
+@cached_response('invoices', 'archive')
+def get_gst_summary():
+    try:
+        try:
+            date_from, date_to = date_range_args()
+        except ValueError:
+            return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+        if not date_from or not date_to:
+            return jsonify({'error': 'from and to are required'}), 400
+
+        rows = gst_summary(load_invoices_between(db, g.org_id, date_from, date_to))
+        if request.args.get('format', 'csv') == 'json':
+            return jsonify({'from': date_from, 'to': date_to, 'rows': rows}), 200
+        filename = f'gst-summary-{date_from}-to-{date_to}.csv'
+        return Response(iter_csv(rows), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
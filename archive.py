@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Hot/cold tiering for invoices and transactions.
+
+Paid invoices and transactions older than ARCHIVE_AFTER_DAYS are moved out of
+the hot `invoices` / `transactions` collections into month partitions:
+
+    archive/{YYYY-MM}                      month marker (server-only)
+    archive/{YYYY-MM}/rollups/{orgId}      an organization's totals for the month
+    archive/{YYYY-MM}/invoices/{id}        archived invoice documents
+    archive/{YYYY-MM}/transactions/{id}    archived transaction documents
+
+Each organization's rollup document keeps running counts and totals (updated
+with increments in the same batch as each move), so dashboards can include
+archived figures without reading archived documents, and without seeing other
+organizations' figures. List endpoints only read archive
+partitions when a date range reaching back into them is requested.
+
+Usage:
+    python archive.py [--days N] [--limit N] [--dry-run]
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from organizations import org_of
+
+try:
+    from firebase_admin import firestore
+except Exception:
+    firestore = None
+
+ARCHIVE_COLLECTION = 'archive'
+ARCHIVED_KINDS = ('invoices', 'transactions')
+ROLLUPS_COLLECTION = 'rollups'
+# Each archived record costs two writes (copy + delete) plus at most one rollup write,
+# and there is one month marker write per month, so 160 records stay within 500 writes
+BATCH_RECORDS = 160
+
+
+def archive_month(date_value):
+    """Month partition ('YYYY-MM') for a record's date, or None when it has no usable date"""
+    if isinstance(date_value, datetime):
+        return date_value.strftime('%Y-%m')
+    if isinstance(date_value, str) and len(date_value) >= 7 and date_value[4] == '-':
+        return date_value[:7]
+    return None
+
+
+def months_between(date_from, date_to):
+    """All YYYY-MM partitions touched by an inclusive YYYY-MM-DD range"""
+    year, month = int(date_from[:4]), int(date_from[5:7])
+    end = (int(date_to[:4]), int(date_to[5:7]))
+    months = []
+    while (year, month) <= end:
+        months.append(f'{year:04d}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _archive_query(db, kind, cutoff):
+    query = db.collection(kind).where('date', '<', cutoff)
+    if kind == 'invoices':
+        query = query.where('status', '==', 'Paid')
+    return query
+
+
+def rollup_totals(kind, records):
+    """Count and totals of records, as stored under {kind} on an organization's rollup document"""
+    if kind == 'invoices':
+        total = sum(r.get('grandTotal') or r.get('amount') or 0 for r in records)
+        return {'count': len(records), 'grandTotal': total}
+    by_category = {}
+    for r in records:
+        category = r.get('category') or 'Miscellaneous Expense'
+        by_category[category] = by_category.get(category, 0) + (r.get('amount') or 0)
+    return {'count': len(records), 'byCategory': by_category}
+
+
+def _increments(totals):
+    return {k: _increments(v) if isinstance(v, dict) else firestore.Increment(v) for k, v in totals.items()}
+
+
+def rollup_ref(db, month, org_id):
+    return db.collection(ARCHIVE_COLLECTION).document(month).collection(ROLLUPS_COLLECTION).document(org_id)
+
+
+def _rollup_deltas(kind, records):
+    """org_id -> increment sentinels for that organization's rollup of records"""
+    by_org = {}
+    for r in records:
+        by_org.setdefault(org_of(r), []).append(r)
+    return {org_id: {kind: _increments(rollup_totals(kind, org_records))}
+            for org_id, org_records in by_org.items()}
+
+
+def _move_chunk(db, kind, docs):
+    batch = db.batch()
+    by_month = {}
+    for doc in docs:
+        data = doc.to_dict()
+        month = archive_month(data.get('date'))
+        by_month.setdefault(month, []).append(data)
+        month_ref = db.collection(ARCHIVE_COLLECTION).document(month)
+        archived = dict(data, orgId=org_of(data), archivedAt=datetime.now())
+        batch.set(month_ref.collection(kind).document(doc.id), archived)
+        batch.delete(doc.reference)
+    for month, records in by_month.items():
+        month_ref = db.collection(ARCHIVE_COLLECTION).document(month)
+        batch.set(month_ref, {'month': month, 'updatedAt': datetime.now()}, merge=True)
+        for org_id, delta in _rollup_deltas(kind, records).items():
+            batch.set(rollup_ref(db, month, org_id),
+                      dict(delta, month=month, orgId=org_id, updatedAt=datetime.now()), merge=True)
+    batch.commit()
+
+
+def archive_old_records(db, older_than_days=None, limit=None, dry_run=False):
+    """Move settled records older than the cutoff into month partitions; returns counts per kind"""
+    if older_than_days is None:
+        older_than_days = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y-%m-%d')
+    stats = {'cutoff': cutoff, 'dryRun': dry_run}
+
+    for kind in ARCHIVED_KINDS:
+        query = _archive_query(db, kind, cutoff)
+        if limit:
+            query = query.limit(limit)
+        moved = 0
+        chunk = []
+        for doc in query.stream():
+            if archive_month(doc.to_dict().get('date')) is None:
+                continue
+            chunk.append(doc)
+            if len(chunk) == BATCH_RECORDS:
+                if not dry_run:
+                    _move_chunk(db, kind, chunk)
+                moved += len(chunk)
+                chunk = []
+        if chunk:
+            if not dry_run:
+                _move_chunk(db, kind, chunk)
+            moved += len(chunk)
+        stats[kind] = moved
+    return stats
+
+
+def load_archived(db, kind, date_from, date_to, org_id):
+    """An organization's archived records of kind whose date lies in the inclusive range"""
+    records = []
+    for month in months_between(date_from, date_to):
+        partition = db.collection(ARCHIVE_COLLECTION).document(month).collection(kind)
+        query = partition.where('orgId', '==', org_id).where('date', '>=', date_from).where('date', '<=', date_to)
+        for doc in query.stream():
+            data = doc.to_dict()
+            data['id'] = doc.id
+            data['archived'] = True
+            records.append(data)
+    return records
+
+
+def load_rollups(db, org_id, date_from=None, date_to=None):
+    """An organization's month rollups, optionally limited to a YYYY-MM range"""
+    query = db.collection_group(ROLLUPS_COLLECTION).where('orgId', '==', org_id)
+    if date_from:
+        query = query.where('month', '>=', date_from[:7])
+    if date_to:
+        query = query.where('month', '<=', date_to[:7])
+    rollups = []
+    for doc in query.order_by('month').stream():
+        rollup = doc.to_dict()
+        rollup.pop('updatedAt', None)
+        rollups.append(rollup)
+    return rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive paid invoices and old transactions')
+    parser.add_argument('--days', type=int, default=None, help='archive records older than this many days')
+    parser.add_argument('--limit', type=int, default=None, help='maximum records per collection in this run')
+    parser.add_argument('--dry-run', action='store_true', help='count records without moving them')
+    args = parser.parse_args()
+
+    from app import db
+    if db is None:
+        print("❌ Firebase is not initialized; cannot archive")
+        return 1
+
+    print("🗄️  Archiving settled invoices and transactions...")
+    stats = archive_old_records(db, args.days, args.limit, args.dry_run)
+    verb = 'Would archive' if args.dry_run else 'Archived'
+    print(f"✅ {verb} {stats['invoices']} invoices and {stats['transactions']} transactions dated before {stats['cutoff']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable backup and restore of the Firestore collections.
+
+Backup reads every collection in id-range partitions (see partitions.py) on a
+thread pool and writes one gzip-compressed JSON Lines shard per partition:
+
+    <dir>/manifest.json                          collections, shard counts, snapshot time
+    <dir>/checkpoint.json                        shards finished so far (restore reads its shard list here)
+    <dir>/<collection>/part-0003.jsonl.gz        {"id": ..., "data": {...}} per line
+    <dir>/archive/month-2025-04.jsonl.gz          {"path": ..., "data": {...}} per line
+
+The archive tree (archive/{month} plus its invoices, transactions and rollups
+subcollections) is backed up with one shard per month; the month list is fixed
+in the manifest on the first run so resumed backups use the same shards.
+
+Left out on purpose: `idempotency_keys` (expiring retry records),
+`blocked_email_changes` (a short-lived change log; instances reload the
+blocklist from `blocked_emails` on start) and `aging_summaries` (rebuilt from
+the invoices on the first aging report).
+
+Shards are written to a .tmp file and renamed when complete, and each finished
+shard is recorded in checkpoint.json, so re-running the same command after an
+interruption only redoes unfinished shards. All partitions read at the same
+snapshot time while it is within Firestore's one-hour read_time window.
+
+Restore replays the shards with chunked WriteBatch commits on a thread pool
+and keeps its own restore-checkpoint.json, so it can be resumed the same way.
+
+Usage:
+    python backup.py backup <dir> [--partitions 16] [--workers 8] [--collections users,invoices]
+    python backup.py restore <dir> [--workers 8] [--batch-size 400] [--collections ...]
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from archive import ARCHIVE_COLLECTION, ARCHIVED_KINDS, ROLLUPS_COLLECTION
+from partitions import id_range_bounds, partition_count, partition_queries
+
+try:
+    from google.cloud.firestore import GeoPoint, DocumentReference
+except Exception:
+    GeoPoint = DocumentReference = None
+
+# counters holds invoice numbering: restoring without it would reissue existing invoice numbers
+BACKUP_COLLECTIONS = ['users', 'invoices', 'transactions', 'blocked_emails', 'unblocked_emails', 'counters',
+                      ARCHIVE_COLLECTION]
+ARCHIVE_SUBCOLLECTIONS = ARCHIVED_KINDS + (ROLLUPS_COLLECTION,)
+# Firestore accepts read_time up to an hour in the past without point-in-time recovery
+SNAPSHOT_WINDOW = timedelta(minutes=55)
+MAX_BATCH_WRITES = 500
+
+
+# Firestore values that JSON can't express are stored as single-key tagged objects
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {'$ts': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode()}
+    if GeoPoint is not None and isinstance(value, GeoPoint):
+        return {'$geo': [value.latitude, value.longitude]}
+    if DocumentReference is not None and isinstance(value, DocumentReference):
+        return {'$ref': value.path}
+    if isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    return value
+
+
+def decode_value(value, db):
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, inner), = value.items()
+            if tag == '$ts':
+                return datetime.fromisoformat(inner)
+            if tag == '$bytes':
+                return base64.b64decode(inner)
+            if tag == '$geo':
+                return GeoPoint(*inner)
+            if tag == '$ref':
+                return db.document(inner)
+        return {k: decode_value(v, db) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v, db) for v in value]
+    return value
+
+
+class Checkpoint:
+    """Set of finished shard names persisted to a JSON file after every update"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {'done': {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def is_done(self, shard):
+        return shard in self.state['done']
+
+    def mark_done(self, shard, count):
+        with self._lock:
+            self.state['done'][shard] = count
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+
+
+def shard_name(collection, index):
+    return f"{collection}/part-{index:04d}.jsonl.gz"
+
+
+def archive_shard_name(month):
+    return f"{ARCHIVE_COLLECTION}/month-{month}.jsonl.gz"
+
+
+def backup_shards(directory, collections):
+    """Every shard the backup in directory wrote for collections, as recorded in its checkpoint"""
+    with open(os.path.join(directory, 'checkpoint.json')) as f:
+        done = json.load(f)['done']
+    return sorted(shard for shard in done if shard.split('/')[0] in collections)
+
+
+def _archive_month_docs(db, month, read_time):
+    """The month document and every document of its subcollections"""
+    month_ref = db.collection(ARCHIVE_COLLECTION).document(month)
+    snapshot = month_ref.get(read_time=read_time) if read_time else month_ref.get()
+    if snapshot.exists:
+        yield snapshot
+    for name in ARCHIVE_SUBCOLLECTIONS:
+        query = month_ref.collection(name)
+        yield from (query.stream(read_time=read_time) if read_time else query.stream())
+
+
+def snapshot_read_time(manifest):
+    """The manifest's snapshot time if Firestore can still read at it, else None"""
+    snapshot = datetime.fromisoformat(manifest['snapshotTime'])
+    if datetime.now(timezone.utc) - snapshot < SNAPSHOT_WINDOW:
+        return snapshot
+    return None
+
+
+def backup(db, directory, collections, partitions=16, workers=8):
+    # Record the number of shards actually written, which is capped at MAX_PARTITIONS
+    partitions = len(id_range_bounds(partitions))
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['partitions'] != partitions or manifest['collections'] != collections:
+            raise SystemExit("❌ Existing backup in this directory used different --partitions/--collections")
+        print(f"↩️  Resuming backup started at {manifest['snapshotTime']}")
+    else:
+        # Whole minutes are valid read times with or without point-in-time recovery
+        snapshot = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        manifest = {'snapshotTime': snapshot.isoformat(), 'partitions': partitions,
+                    'collections': collections, 'format': 'jsonl.gz'}
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    read_time = snapshot_read_time(manifest)
+    if read_time is None:
+        print("⚠️ Snapshot time is too old to read at; remaining shards will reflect current data")
+        manifest['consistent'] = False
+    if ARCHIVE_COLLECTION in collections and 'archiveMonths' not in manifest:
+        months = db.collection(ARCHIVE_COLLECTION).select([])
+        months = months.stream(read_time=read_time) if read_time else months.stream()
+        manifest['archiveMonths'] = sorted(doc.id for doc in months)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    checkpoint = Checkpoint(os.path.join(directory, 'checkpoint.json'))
+
+    def dump(job):
+        shard, docs, key = job
+        path = os.path.join(directory, shard)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        count = 0
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            for doc in docs():
+                record = {key: doc.id if key == 'id' else doc.reference.path, 'data': encode_value(doc.to_dict())}
+                f.write(json.dumps(record, separators=(',', ':')))
+                f.write('\n')
+                count += 1
+        os.replace(path + '.tmp', path)
+        checkpoint.mark_done(shard, count)
+        return count
+
+    jobs = []
+    for collection in collections:
+        if collection == ARCHIVE_COLLECTION:
+            for month in manifest['archiveMonths']:
+                if not checkpoint.is_done(archive_shard_name(month)):
+                    jobs.append((archive_shard_name(month),
+                                 lambda month=month: _archive_month_docs(db, month, read_time), 'path'))
+            continue
+        for index, query in enumerate(partition_queries(db.collection(collection), partitions)):
+            if not checkpoint.is_done(shard_name(collection, index)):
+                jobs.append((shard_name(collection, index),
+                             lambda query=query: query.stream(read_time=read_time) if read_time else query.stream(),
+                             'id'))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        written = sum(pool.map(dump, jobs))
+    elapsed = time.perf_counter() - started
+
+    manifest['counts'] = {c: sum(n for shard, n in checkpoint.state['done'].items() if shard.startswith(c + '/'))
+                          for c in collections}
+    manifest['completedAt'] = datetime.now(timezone.utc).isoformat()
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Backed up {written} documents from {len(jobs)} shards in {elapsed:.1f}s")
+    return manifest
+
+
+def restore(db, directory, collections=None, workers=8, batch_size=400):
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if 'completedAt' not in manifest:
+        raise SystemExit("❌ Backup is incomplete; re-run the backup command to finish it first")
+    collections = collections or manifest['collections']
+    batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+    checkpoint = Checkpoint(os.path.join(directory, 'restore-checkpoint.json'))
+
+    def load(shard):
+        collection_ref = db.collection(shard.split('/')[0])
+        count = 0
+        batch, pending = db.batch(), 0
+        with gzip.open(os.path.join(directory, shard), 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                # Archive shards store full document paths, collection shards store ids
+                doc_ref = db.document(record['path']) if 'path' in record else collection_ref.document(record['id'])
+                batch.set(doc_ref, decode_value(record['data'], db))
+                pending += 1
+                if pending == batch_size:
+                    batch.commit()
+                    count += pending
+                    batch, pending = db.batch(), 0
+        if pending:
+            batch.commit()
+            count += pending
+        checkpoint.mark_done(shard, count)
+        return count
+
+    shards = [s for s in backup_shards(directory, collections) if not checkpoint.is_done(s)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        restored = sum(pool.map(load, shards))
+    elapsed = time.perf_counter() - started
+    rate = restored / elapsed if elapsed else 0
+    print(f"✅ Restored {restored} documents from {len(shards)} shards in {elapsed:.1f}s ({rate:.0f} docs/s)")
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backup and restore FinanceFlow Firestore collections')
+    parser.add_argument('command', choices=['backup', 'restore'])
+    parser.add_argument('directory', help='backup directory')
+    parser.add_argument('--collections', help=f"comma-separated (default: {','.join(BACKUP_COLLECTIONS)})")
+    parser.add_argument('--partitions', type=partition_count, default=16,
+                        help='id-range shards per collection (backup, at most 62)')
+    parser.add_argument('--workers', type=int, default=8, help='shards read or written in parallel')
+    parser.add_argument('--batch-size', type=int, default=400, help=f'writes per batch commit (max {MAX_BATCH_WRITES})')
+    args = parser.parse_args()
+
+    from app import db
+    if db is None:
+        print("❌ Firebase is not initialized")
+        return 1
+
+    collections = args.collections.split(',') if args.collections else None
+    if args.command == 'backup':
+        print(f"💾 Backing up to {args.directory}...")
+        backup(db, args.directory, collections or BACKUP_COLLECTIONS, args.partitions, args.workers)
+    else:
+        print(f"♻️  Restoring from {args.directory}...")
+        restore(db, args.directory, collections, args.workers, args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
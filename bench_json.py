@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON encoding of large invoice list responses.
+
+Compares Flask's default provider with FastJSONProvider (orjson and stdlib
+encoders) on synthetic invoice payloads shaped like Firestore documents.
+
+Usage:
+    python bench_json.py [--invoices 10000] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, dumps_bytes, orjson
+
+try:
+    from google.api_core.datetime_helpers import DatetimeWithNanoseconds as Timestamp
+except Exception:
+    Timestamp = datetime
+
+
+def make_invoices(count, seed=42):
+    """Synthetic invoices with Firestore-style timestamps and nested items"""
+    rng = random.Random(seed)
+    start = datetime(2024, 4, 1, tzinfo=timezone.utc)
+    invoices = []
+    for i in range(count):
+        created = start + timedelta(minutes=rng.randint(0, 525600))
+        items = []
+        for _ in range(rng.randint(1, 6)):
+            quantity = rng.randint(1, 20)
+            price = round(rng.uniform(100, 5000), 2)
+            items.append({
+                'description': f'Service line {rng.randint(1, 500)}',
+                'hsnCode': str(rng.choice([998311, 998313, 998314, 847130, 852351])),
+                'quantity': quantity,
+                'unit': 'Nos',
+                'listPrice': price,
+                'discount': 0,
+                'amount': round(quantity * price, 2)
+            })
+        subtotal = round(sum(item['amount'] for item in items), 2)
+        invoices.append({
+            'id': f'doc{i:08d}',
+            'invoiceNumber': f'INV-2425-{i + 1:05d}',
+            'orderNo': f'PO-{rng.randint(1000, 9999)}',
+            'date': created.strftime('%Y-%m-%d'),
+            'dueDate': (created + timedelta(days=30)).strftime('%Y-%m-%d'),
+            'clientName': f'Client {rng.randint(1, 300)}',
+            'clientGstin': f'29ABCDE{rng.randint(1000, 9999)}F1Z5',
+            'shippingAddress': 'Plot 12, Industrial Area, Bengaluru, Karnataka 560001',
+            'items': items,
+            'subtotal': subtotal,
+            'sgstRate': 9,
+            'cgstRate': 9,
+            'grandTotal': round(subtotal * 1.18, 2),
+            'status': rng.choice(['Paid', 'Pending', 'Overdue']),
+            'createdAt': Timestamp(created.year, created.month, created.day, created.hour,
+                                   created.minute, tzinfo=timezone.utc)
+        })
+    return invoices
+
+
+def time_encoder(encode, payload, repeat):
+    timings = []
+    body = b''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(payload)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON encoding of invoice lists')
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    payload = make_invoices(args.invoices)
+
+    encoders = [
+        ('flask default', lambda obj: default_provider.dumps(obj, separators=(',', ':')).encode()),
+        ('fast (stdlib)', lambda obj: dumps_bytes(obj, 'stdlib')),
+    ]
+    if orjson is not None:
+        encoders.append(('fast (orjson)', lambda obj: dumps_bytes(obj, 'orjson')))
+    else:
+        print("ℹ️ orjson not installed; skipping the orjson encoder")
+
+    with app.app_context():
+        print(f"📦 Encoding {args.invoices} invoices (median of {args.repeat} runs, provider: {fast_provider.encoder})")
+        print(f"{'encoder':<16} {'ms':>10} {'bytes':>12}")
+        baseline = None
+        for name, encode in encoders:
+            seconds, size = time_encoder(encode, payload, args.repeat)
+            baseline = baseline or seconds
+            print(f"{name:<16} {seconds * 1000:>10.1f} {size:>12,}  ({baseline / seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark password verification throughput at different cost settings.
+
+Each setting gets its own PasswordHasher with the configured pool, and
+--concurrency client threads verify passwords against it like concurrent
+logins. Reports logins per second, p50/p99 latency and how many attempts
+were rejected with HasherBusy because the queue was full.
+
+Usage:
+    python bench_passwords.py [--logins 200] [--concurrency 16] [--workers N] [--max-queue 32]
+                              [--settings scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2_sha256:600000]
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from passwords import PasswordHasher, HasherBusy
+
+DEFAULT_SETTINGS = 'scrypt:8192:8:1,scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2_sha256:310000,pbkdf2_sha256:600000'
+
+
+def parse_setting(text):
+    algorithm, *params = text.split(':')
+    return algorithm, tuple(int(v) for v in params)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(hasher, stored, logins, concurrency):
+    latencies = []
+    rejected = 0
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def client():
+        nonlocal rejected
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                if not hasher.verify('correct horse battery staple', stored):
+                    raise AssertionError('verification failed')
+            except HasherBusy:
+                with lock:
+                    rejected += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark password hashing cost settings')
+    parser.add_argument('--logins', type=int, default=200, help='verifications per setting')
+    parser.add_argument('--concurrency', type=int, default=16, help='simultaneous login threads')
+    parser.add_argument('--workers', type=int, default=None, help='hashing pool size (default: CPU count)')
+    parser.add_argument('--max-queue', type=int, default=32, help='hashes allowed to wait for a worker')
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--settings', default=DEFAULT_SETTINGS,
+                        help='comma-separated scrypt:N:r:p or pbkdf2_sha256:iterations')
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 2
+    print(f"🔐 {args.logins} logins per setting, {args.concurrency} concurrent, "
+          f"{workers} {args.pool} workers, queue {args.max_queue}")
+    print(f"{'setting':<24} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rejected':>9}")
+    for text in args.settings.split(','):
+        algorithm, params = parse_setting(text)
+        hasher = PasswordHasher(algorithm, params, workers, args.max_queue, args.pool)
+        try:
+            stored = hasher.hash('correct horse battery staple')
+            elapsed, latencies, rejected = run(hasher, stored, args.logins, args.concurrency)
+        finally:
+            hasher.shutdown()
+        if not latencies:
+            print(f"{text:<24} {'-':>9} {'-':>8} {'-':>8} {rejected:>9}")
+            continue
+        print(f"{text:<24} {len(latencies) / elapsed:>9.1f} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {rejected:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+In-memory blocked-email membership for the auth endpoints.
+
+The `blocked_emails` collection is loaded once per instance into a set (or,
+above BLOCKLIST_BLOOM_THRESHOLD entries, a Bloom filter whose hits are
+confirmed with a Firestore lookup), so signup and login can check it without a
+read per request.
+
+Every block/unblock goes through a transaction that bumps the version counter
+`counters/blocked-emails` and records the change in `blocked_email_changes`
+under that version. Instances poll the version document at most every
+BLOCKLIST_REFRESH_SECONDS and replay only the newer changes; the instance that
+handled the admin request applies the change to its own copy immediately.
+
+Change entries carry an `expiresAt` field BLOCKLIST_CHANGE_RETENTION_DAYS ahead;
+configure a Firestore TTL policy on it so the log doesn't grow forever. An
+instance that finds changes missing from the log (expired before it saw them)
+falls back to a full reload.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    from firebase_admin import firestore
+except Exception:
+    firestore = None
+
+BLOCKED_COLLECTION = 'blocked_emails'
+CHANGES_COLLECTION = 'blocked_email_changes'
+VERSION_DOCUMENT = ('counters', 'blocked-emails')
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.sha256(value.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+
+class BlockedEmails:
+    def __init__(self, db, refresh_seconds=None, bloom_threshold=None):
+        self.db = db
+        self.refresh_seconds = int(refresh_seconds or os.getenv('BLOCKLIST_REFRESH_SECONDS', '30'))
+        self.bloom_threshold = int(bloom_threshold or os.getenv('BLOCKLIST_BLOOM_THRESHOLD', '200000'))
+        self.change_retention = timedelta(days=int(os.getenv('BLOCKLIST_CHANGE_RETENTION_DAYS', '7')))
+        self._lock = threading.Lock()
+        self._emails = None
+        self._bloom = None
+        self._version = 0
+        self._checked_at = 0
+
+    def _version_ref(self):
+        return self.db.collection(VERSION_DOCUMENT[0]).document(VERSION_DOCUMENT[1])
+
+    def _read_version(self):
+        snapshot = self._version_ref().get()
+        return snapshot.to_dict().get('version', 0) if snapshot.exists else 0
+
+    def load(self):
+        """Full reload of the blocked collection"""
+        version = self._read_version()
+        emails = set()
+        for doc in self.db.collection(BLOCKED_COLLECTION).select(['email']).stream():
+            email = (doc.to_dict().get('email') or '').strip().lower()
+            if email:
+                emails.add(email)
+        bloom = None
+        if len(emails) > self.bloom_threshold:
+            bloom = BloomFilter(len(emails) * 2)
+            for email in emails:
+                bloom.add(email)
+            emails = set()
+        with self._lock:
+            self._emails, self._bloom = emails, bloom
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _apply(self, email, blocked):
+        if self._bloom is not None:
+            # Bloom filters can't forget; unblocked hits are rejected by the Firestore confirmation
+            if blocked:
+                self._bloom.add(email)
+        elif blocked:
+            self._emails.add(email)
+        else:
+            self._emails.discard(email)
+
+    def refresh(self):
+        """Replay changes newer than our version, or reload if we have never loaded"""
+        if self._emails is None:
+            self.load()
+            return
+        version = self._read_version()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version <= self._version:
+                return
+            since = self._version
+        # Read outside the lock so auth checks keep answering from the current set meanwhile
+        changes = [doc.to_dict() for doc in self.db.collection(CHANGES_COLLECTION)
+                   .where('version', '>', since).order_by('version').stream()]
+        if not changes or changes[0]['version'] != since + 1:
+            # Entries we never saw have expired from the log
+            self.load()
+            return
+        with self._lock:
+            for change in changes:
+                if change['version'] <= self._version:
+                    continue
+                self._apply(change['email'], change['blocked'])
+                self._version = change['version']
+
+    def _confirm(self, email):
+        query = self.db.collection(BLOCKED_COLLECTION).where('email', '==', email).limit(1)
+        return any(True for _ in query.stream())
+
+    def is_blocked(self, email):
+        email = (email or '').strip().lower()
+        if not email:
+            return False
+        if self._emails is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh()
+        with self._lock:
+            if self._bloom is None:
+                return email in self._emails
+            candidate = email in self._bloom
+        return candidate and self._confirm(email)
+
+    def _record_change(self, email, blocked, actor):
+        version_ref = self._version_ref()
+        blocked_ref = self.db.collection(BLOCKED_COLLECTION)
+        existing_query = blocked_ref.where('email', '==', email)
+
+        @firestore.transactional
+        def write(transaction):
+            snapshot = version_ref.get(transaction=transaction)
+            version = (snapshot.to_dict().get('version', 0) if snapshot.exists else 0) + 1
+            existing = list(transaction.get(existing_query))
+            if blocked and not existing:
+                transaction.set(blocked_ref.document(), {
+                    'email': email, 'blocked_at': datetime.now(), 'blocked_by': actor
+                })
+            elif not blocked:
+                for doc in existing:
+                    transaction.delete(doc.reference)
+            transaction.set(self.db.collection(CHANGES_COLLECTION).document(str(version)), {
+                'email': email, 'blocked': blocked, 'version': version, 'at': datetime.now(),
+                'expiresAt': datetime.utcnow() + self.change_retention
+            })
+            transaction.set(version_ref, {'version': version, 'updatedAt': datetime.now()}, merge=True)
+            return version
+
+        version = write(self.db.transaction())
+        with self._lock:
+            if self._emails is not None:
+                self._apply(email, blocked)
+                # Only skip ahead when no other instance's change is in between
+                if version == self._version + 1:
+                    self._version = version
+        return version
+
+    def block(self, email, actor='admin'):
+        return self._record_change(email.strip().lower(), True, actor)
+
+    def unblock(self, email, actor='admin'):
+        return self._record_change(email.strip().lower(), False, actor)
@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
 """
-Test script to check database state
+Database check and audit tool.
+
+Checks the configured admin user, then audits users, invoices and transactions
+by scanning each collection in id-range partitions on a thread pool:
+duplicate emails, invoices whose grandTotal doesn't match items + SGST/CGST,
+transactions with unknown categories and records owned by deleted users.
+
+Usage:
+    python check_db.py [--partitions 8] [--workers 8] [--output report.json] [--skip-admin]
 """
 
+import argparse
+import json
 import os
-from app import db, hash_password, init_admin_user
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from app import db, init_admin_user
+from money import CENT, to_decimal
+from passwords import verify_password, needs_rehash
+from partitions import id_range_bounds, partition_count, scan_partitions
 
 def check_admin_user():
     print("🔍 Checking admin user in database...")
@@ -29,9 +44,9 @@ def check_admin_user():
             # Test password if provided in env (do not print it)
             admin_password = os.getenv('ADMIN_PASSWORD')
             if admin_password and 'password' in admin_data:
-                expected_hash = hash_password(admin_password)
-                actual_hash = admin_data.get('password')
-                print(f"   Password matches: {actual_hash == expected_hash}")
+                stored_hash = admin_data.get('password')
+                print(f"   Password matches: {verify_password(admin_password, stored_hash)}")
+                print(f"   Hash needs upgrade: {needs_rehash(stored_hash)}")
             
             return True
         else:
@@ -42,28 +57,110 @@ def check_admin_user():
         print(f"❌ Error checking admin user: {str(e)}")
         return False
 
-def check_all_users():
-    print("\n👥 All users in database:")
-    
-    try:
-        users_ref = db.collection('users')
-        docs = list(users_ref.stream())
-        
-        if not docs:
-            print("   No users found")
-            return
-        
-        for i, doc in enumerate(docs, 1):
-            user_data = doc.to_dict()
-            print(f"   {i}. ID: {doc.id}")
-            print(f"      Email: {user_data.get('email')}")
-            print(f"      Role: {user_data.get('role')}")
-            print(f"      Status: {user_data.get('status')}")
-            print(f"      Created: {user_data.get('createdAt')}")
-            print()
-            
-    except Exception as e:
-        print(f"❌ Error checking users: {str(e)}")
+# Categories the dashboard knows how to file transactions under (see accountsData in script.js)
+KNOWN_CATEGORIES = {
+    'Employee Payment', 'Allowance', 'Reimbursement', 'Purchase',
+    'Vendor Payment', 'Miscellaneous Income', 'Miscellaneous Expense'
+}
+# Findings of each kind kept in the report; the counts are always complete
+MAX_FINDINGS = 1000
+
+def expected_grand_total(invoice):
+    """Items + SGST + CGST, computed the way the invoice form does"""
+    subtotal = sum((to_decimal(item.get('amount')) for item in invoice.get('items') or []), Decimal(0))
+    tax_rate = (to_decimal(invoice.get('sgstRate')) + to_decimal(invoice.get('cgstRate'))) / 100
+    return (subtotal * (1 + tax_rate)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def owner_of(record):
+    return record.get('createdBy') or record.get('userId')
+
+def audit_users_partition(query):
+    emails = {}
+    ids = []
+    for doc in query.stream():
+        ids.append(doc.id)
+        email = (doc.to_dict().get('email') or '').strip().lower()
+        if email:
+            emails.setdefault(email, []).append(doc.id)
+    return {'scanned': len(ids), 'ids': ids, 'emails': emails}
+
+def audit_invoices_partition(query, user_ids):
+    result = {'scanned': 0, 'grandTotalMismatch': [], 'orphaned': []}
+    for doc in query.stream():
+        result['scanned'] += 1
+        invoice = doc.to_dict()
+        expected = expected_grand_total(invoice)
+        actual = to_decimal(invoice.get('grandTotal')).quantize(CENT, rounding=ROUND_HALF_UP)
+        if invoice.get('items') and abs(expected - actual) > CENT:
+            result['grandTotalMismatch'].append({'id': doc.id, 'grandTotal': str(actual), 'expected': str(expected)})
+        owner = owner_of(invoice)
+        if owner and owner not in user_ids:
+            result['orphaned'].append({'id': doc.id, 'owner': owner})
+    return result
+
+def audit_transactions_partition(query, user_ids):
+    result = {'scanned': 0, 'unknownCategory': [], 'orphaned': []}
+    for doc in query.stream():
+        result['scanned'] += 1
+        transaction = doc.to_dict()
+        if transaction.get('category') not in KNOWN_CATEGORIES:
+            result['unknownCategory'].append({'id': doc.id, 'category': transaction.get('category')})
+        owner = owner_of(transaction)
+        if owner and owner not in user_ids:
+            result['orphaned'].append({'id': doc.id, 'owner': owner})
+    return result
+
+def merge_findings(results, keys):
+    merged = {'scanned': sum(r['scanned'] for r in results)}
+    for key in keys:
+        findings = [finding for r in results for finding in r[key]]
+        merged[key] = {'count': len(findings), 'items': findings[:MAX_FINDINGS]}
+    return merged
+
+def throughput(scanned, seconds):
+    return {'documents': scanned, 'seconds': round(seconds, 3),
+            'docsPerSecond': round(scanned / seconds, 1) if seconds else None}
+
+def run_audit(partitions=8, workers=8):
+    """Scan users, invoices and transactions partition by partition in parallel"""
+    # The partition count is capped at MAX_PARTITIONS; report the number actually scanned
+    partitions = len(id_range_bounds(partitions))
+    report = {'startedAt': datetime.now().isoformat(), 'partitions': partitions, 'workers': workers}
+
+    results, seconds = scan_partitions(db.collection('users'), audit_users_partition, partitions, workers)
+    emails = {}
+    for r in results:
+        for email, ids in r['emails'].items():
+            emails.setdefault(email, []).extend(ids)
+    user_ids = {user_id for r in results for user_id in r['ids']}
+    duplicates = [{'email': email, 'ids': ids} for email, ids in emails.items() if len(ids) > 1]
+    scanned = sum(r['scanned'] for r in results)
+    report['users'] = {
+        'throughput': throughput(scanned, seconds),
+        'duplicateEmails': {'count': len(duplicates), 'items': duplicates[:MAX_FINDINGS]}
+    }
+
+    results, seconds = scan_partitions(db.collection('invoices'),
+                                       lambda q: audit_invoices_partition(q, user_ids), partitions, workers)
+    report['invoices'] = merge_findings(results, ['grandTotalMismatch', 'orphaned'])
+    report['invoices']['throughput'] = throughput(report['invoices'].pop('scanned'), seconds)
+
+    results, seconds = scan_partitions(db.collection('transactions'),
+                                       lambda q: audit_transactions_partition(q, user_ids), partitions, workers)
+    report['transactions'] = merge_findings(results, ['unknownCategory', 'orphaned'])
+    report['transactions']['throughput'] = throughput(report['transactions'].pop('scanned'), seconds)
+
+    report['finishedAt'] = datetime.now().isoformat()
+    return report
+
+def print_audit_summary(report):
+    print("\n📋 Audit summary:")
+    for collection in ('users', 'invoices', 'transactions'):
+        section = report[collection]
+        t = section['throughput']
+        findings = ', '.join(f"{key}: {value['count']}" for key, value in section.items() if key != 'throughput')
+        print(f"   {collection}: {t['documents']} docs in {t['seconds']}s ({t['docsPerSecond']} docs/s) - {findings}")
+
 
 def recreate_admin():
     print("🔧 Recreating admin user...")
@@ -74,23 +171,48 @@ def recreate_admin():
         print(f"❌ Error creating admin: {str(e)}")
         return False
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description='Check the admin user and audit Firestore collections')
+    parser.add_argument('--partitions', type=partition_count, default=8,
+                        help='id-range partitions per collection (at most 62)')
+    parser.add_argument('--workers', type=int, default=8, help='parallel partition scans')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--skip-admin', action='store_true', help='skip the admin user check')
+    args = parser.parse_args()
+
     print("🔧 Database Check Tool")
     print("=" * 50)
-    
-    # Check if admin exists
-    admin_exists = check_admin_user()
-    
-    # Show all users
-    check_all_users()
-    
-    # Recreate admin if needed
-    if not admin_exists:
-        print("🔄 Admin user not found, creating...")
-        if recreate_admin():
-            print("✅ Admin user created successfully")
-            check_admin_user()
-        else:
-            print("❌ Failed to create admin user")
-    
+
+    if db is None:
+        print("❌ Firebase is not initialized; nothing to check")
+        return 1
+
+    if not args.skip_admin:
+        # Check if admin exists
+        admin_exists = check_admin_user()
+
+        # Recreate admin if needed
+        if not admin_exists:
+            print("🔄 Admin user not found, creating...")
+            if recreate_admin():
+                print("✅ Admin user created successfully")
+                check_admin_user()
+            else:
+                print("❌ Failed to create admin user")
+
+    print(f"\n🔎 Auditing collections ({args.partitions} partitions, {args.workers} workers)...")
+    report = run_audit(args.partitions, args.workers)
+    print_audit_summary(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
     print("\n✅ Check complete!")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
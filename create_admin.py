@@ -5,13 +5,11 @@ Run this script once to create an admin account that can approve other users.
 """
 
 import sys
-import hashlib
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+from organizations import DEFAULT_ORG_ID
+from passwords import hash_password
 
 def create_admin_user():
     try:
@@ -63,6 +61,7 @@ def create_admin_user():
             'password': hash_password(password),
             'status': 'approved',  # Admin is automatically approved
             'role': 'Admin',
+            'orgId': DEFAULT_ORG_ID,
             'createdAt': datetime.now(),
             'lastLogin': None
         }
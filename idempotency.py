@@ -0,0 +1,132 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client that retries POST /api/invoices or POST /api/transactions with the same
+Idempotency-Key header gets the original response back instead of creating a
+duplicate document. The key record is written in the same Firestore transaction
+as the document it created, so a key can never point at a write that did not
+happen (or vice versa).
+
+Records live in the `idempotency_keys` collection with an `expiresAt` field
+(configure a Firestore TTL policy on it to have old keys purged). Recent
+responses are also kept in a small in-process cache so retry storms against one
+instance are answered without any Firestore reads.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+try:
+    from firebase_admin import firestore
+except Exception:
+    firestore = None
+
+IDEMPOTENCY_COLLECTION = 'idempotency_keys'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request body"""
+
+
+def request_fingerprint(data):
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, db, ttl_seconds=None, max_cached=None):
+        self.db = db
+        self.ttl_seconds = int(ttl_seconds or os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+        self.max_cached = int(max_cached or os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+        self._lock = threading.Lock()
+        # record_id -> (expires_at_monotonic, fingerprint, body, status)
+        self._cache = OrderedDict()
+
+    def record_id(self, scope, user_id, key):
+        """Keys are scoped per endpoint and user so clients can't collide with each other"""
+        return hashlib.sha256(f'{scope}:{user_id}:{key}'.encode()).hexdigest()
+
+    def _remember(self, record_id, fingerprint, body, status):
+        with self._lock:
+            self._cache[record_id] = (time.monotonic() + self.ttl_seconds, fingerprint, body, status)
+            self._cache.move_to_end(record_id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _cached(self, record_id):
+        with self._lock:
+            entry = self._cache.get(record_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._cache[record_id]
+                return None
+            return entry
+
+    def _from_record(self, record_id, snapshot):
+        """Turn a stored, unexpired key record into a (fingerprint, body, status) tuple"""
+        if not snapshot.exists:
+            return None
+        record = snapshot.to_dict()
+        expires_at = record.get('expiresAt')
+        if expires_at is not None and expires_at.replace(tzinfo=None) < datetime.utcnow():
+            return None
+        self._remember(record_id, record.get('fingerprint'), record.get('response'), record.get('status', 200))
+        return record.get('fingerprint'), record.get('response'), record.get('status', 200)
+
+    @staticmethod
+    def _check(found, fingerprint):
+        if found is None:
+            return None
+        stored_fingerprint, body, status = found
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict('Idempotency-Key was already used with a different request')
+        return body, status
+
+    def replay(self, record_id, data):
+        """Return (body, status) of an earlier request with this key, or None"""
+        fingerprint = request_fingerprint(data)
+        cached = self._cached(record_id)
+        if cached is not None:
+            return self._check(cached[1:], fingerprint)
+        snapshot = self.db.collection(IDEMPOTENCY_COLLECTION).document(record_id).get()
+        return self._check(self._from_record(record_id, snapshot), fingerprint)
+
+    def commit(self, record_id, data, doc_ref, prepare, status=200):
+        """
+        Write the document built by prepare(transaction) -> (document, body) to
+        doc_ref and record the key in one transaction. prepare runs after the key
+        is checked, so its own reads and writes (e.g. taking an invoice number)
+        only happen when the document is written.
+        Returns (body, status, document); document is None when a concurrent
+        request with the same key won the race and nothing was written.
+        """
+        fingerprint = request_fingerprint(data)
+        record_ref = self.db.collection(IDEMPOTENCY_COLLECTION).document(record_id)
+
+        @firestore.transactional
+        def write(transaction):
+            found = self._from_record(record_id, record_ref.get(transaction=transaction))
+            if found is not None:
+                return self._check(found, fingerprint) + (None,)
+            document, body = prepare(transaction)
+            transaction.set(doc_ref, document)
+            transaction.set(record_ref, {
+                'fingerprint': fingerprint,
+                'response': body,
+                'status': status,
+                'createdAt': datetime.utcnow(),
+                'expiresAt': datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            })
+            return body, status, document
+
+        body, status, document = write(self.db.transaction())
+        if document is not None:
+            self._remember(record_id, fingerprint, body, status)
+        return body, status, document
@@ -0,0 +1,144 @@
+"""
+Server-side invoice number allocation for FinanceFlow Pro.
+
+Numbers are sequential per organization and financial year (e.g. INV-2627-00042
+for FY 2026-27) and reset to 1 when a new financial year starts. Each
+organization and financial year has its own counter document in the `counters`
+collection.
+
+With INVOICE_NUMBER_BLOCK_SIZE=1 (the default) the counter is read and
+advanced inside the same transaction that writes the invoice (and its
+Idempotency-Key record), so a number is only used up when the invoice is
+actually written and the series stays gap-free for GST filings.
+
+Larger blocks keep concurrent creators off a single hot document: each instance
+reserves a block of numbers in one Firestore transaction and hands them out
+locally. That cuts counter writes by the block size, at the cost of gaps when
+an instance shuts down before using its whole block or an invoice write fails
+after its number was handed out.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+from organizations import DEFAULT_ORG_ID
+
+try:
+    from firebase_admin import firestore
+except Exception:
+    firestore = None
+
+COUNTERS_COLLECTION = 'counters'
+
+
+def financial_year_for(date=None, start_month=None):
+    """Return the financial year label (e.g. '2026-27') a date falls in"""
+    if start_month is None:
+        start_month = int(os.getenv('INVOICE_FY_START_MONTH', '4'))
+    date = date or datetime.now()
+    start_year = date.year if date.month >= start_month else date.year - 1
+    return f"{start_year}-{str(start_year + 1)[-2:]}"
+
+
+def parse_invoice_date(value):
+    """Parse the invoice form's YYYY-MM-DD date, falling back to today"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d')
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def format_invoice_number(prefix, financial_year, sequence):
+    # INV-2627-00042 stays within the 16 character GST invoice number limit
+    start, end = financial_year.split('-')
+    return f"{prefix}-{start[-2:]}{end}-{sequence:05d}"
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from the FY counter document"""
+
+    def __init__(self, db, prefix=None, block_size=None):
+        self.db = db
+        self.prefix = prefix or os.getenv('INVOICE_NUMBER_PREFIX', 'INV')
+        self.block_size = max(1, int(block_size or os.getenv('INVOICE_NUMBER_BLOCK_SIZE', '1')))
+        self._locks_guard = threading.Lock()
+        # (org_id, financial_year) -> lock guarding that key's blocks
+        self._locks = {}
+        # (org_id, financial_year) -> [[next_sequence, end_of_block_exclusive], ...]
+        self._blocks = {}
+
+    @property
+    def gap_free(self):
+        """True when numbers must be taken with next_in_transaction() in the invoice's own transaction"""
+        return self.block_size == 1
+
+    def _counter_ref(self, org_id, financial_year):
+        # The default organization keeps the counters it used before organizations existed
+        name = f'invoice-{financial_year}' if org_id == DEFAULT_ORG_ID else f'invoice-{org_id}-{financial_year}'
+        return self.db.collection(COUNTERS_COLLECTION).document(name)
+
+    def _advance(self, transaction, org_id, financial_year, count):
+        """Read the counter and move it on by count in transaction; returns the first reserved sequence"""
+        counter_ref = self._counter_ref(org_id, financial_year)
+        snapshot = counter_ref.get(transaction=transaction)
+        start = snapshot.to_dict().get('next', 1) if snapshot.exists else 1
+        transaction.set(counter_ref, {
+            'next': start + count,
+            'financialYear': financial_year,
+            'orgId': org_id,
+            'updatedAt': datetime.now()
+        }, merge=True)
+        return start
+
+    def next_in_transaction(self, transaction, invoice_date=None, org_id=DEFAULT_ORG_ID):
+        """
+        Take the next number inside the caller's transaction, which must also write
+        the invoice. Call it after the transaction's other reads; returns
+        (invoice_number, financial_year).
+        """
+        financial_year = financial_year_for(invoice_date)
+        sequence = self._advance(transaction, org_id, financial_year, 1)
+        return format_invoice_number(self.prefix, financial_year, sequence), financial_year
+
+    def _reserve_block(self, org_id, financial_year):
+        @firestore.transactional
+        def reserve(transaction):
+            return self._advance(transaction, org_id, financial_year, self.block_size)
+
+        start = reserve(self.db.transaction())
+        return [start, start + self.block_size]
+
+    def _take(self, key):
+        """Next sequence from the key's reserved blocks, or None when they are used up"""
+        blocks = self._blocks.setdefault(key, [])
+        while blocks and blocks[0][0] >= blocks[0][1]:
+            blocks.pop(0)
+        if not blocks:
+            return None
+        sequence = blocks[0][0]
+        blocks[0][0] += 1
+        return sequence
+
+    def allocate(self, invoice_date=None, org_id=DEFAULT_ORG_ID):
+        """
+        Return (invoice_number, financial_year) from a locally reserved block. Only
+        the (organization, FY) being numbered is locked, and not while a new block
+        is reserved; a block reserved by a racing thread is kept for later.
+        """
+        financial_year = financial_year_for(invoice_date)
+        key = (org_id, financial_year)
+        with self._locks_guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            sequence = self._take(key)
+        if sequence is None:
+            block = self._reserve_block(org_id, financial_year)
+            with lock:
+                self._blocks[key].append(block)
+                sequence = self._take(key)
+        return format_invoice_number(self.prefix, financial_year, sequence), financial_year
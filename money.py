@@ -0,0 +1,21 @@
+"""
+Decimal helpers for invoice amounts, shared by the reports and the audit tool.
+
+Amounts arrive as floats, strings or None from Firestore; converting through
+str() keeps what was entered (100.1 stays 100.1, not 100.099999...).
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def to_paise(value):
+    return int((to_decimal(value).quantize(CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Organization (tenant) scoping.
+
+Every user belongs to one organization (`users.orgId`), and every invoice,
+transaction and archived record carries the `orgId` of the organization that
+owns it. All API queries filter on `orgId`, so a team's requests only touch its
+own documents. Users created before organizations existed belong to
+DEFAULT_ORG_ID. New signups are created with `orgId: null` and have no data
+access until an admin assigns them an organization, so approving a new user
+never exposes the default organization's data by accident.
+
+Running this module migrates existing data: documents without an `orgId` are
+assigned their creator's organization (or DEFAULT_ORG_ID) in parallel
+partitioned scans with chunked batch writes, and archive month rollups are
+rebuilt per organization.
+
+Usage:
+    python organizations.py [--partitions 8] [--workers 8] [--batch-size 400] [--dry-run]
+"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_ORG_ID = os.getenv('DEFAULT_ORG_ID', 'default')
+ORG_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+SCOPED_COLLECTIONS = ('invoices', 'transactions')
+
+
+def valid_org_id(org_id):
+    return bool(org_id) and bool(ORG_ID_PATTERN.match(org_id))
+
+
+def user_org(user_data):
+    """A user's organization; None while a new signup is unassigned"""
+    if 'orgId' not in user_data:
+        # Accounts created before organizations existed
+        return DEFAULT_ORG_ID
+    return user_data['orgId'] or None
+
+
+def org_of(record, user_orgs=None):
+    """A record's organization: its own orgId, else its creator's, else the default"""
+    if record.get('orgId'):
+        return record['orgId']
+    owner = record.get('createdBy') or record.get('userId')
+    if user_orgs and owner in user_orgs:
+        return user_orgs[owner]
+    return DEFAULT_ORG_ID
+
+
+class _BatchWriter:
+    """Collects updates and commits them in chunks of batch_size"""
+
+    def __init__(self, db, batch_size, dry_run):
+        self.db = db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.pending = []
+        self.written = 0
+
+    def update(self, ref, fields):
+        self.pending.append((ref, fields))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending and not self.dry_run:
+            batch = self.db.batch()
+            for ref, fields in self.pending:
+                batch.update(ref, fields)
+            batch.commit()
+        self.written += len(self.pending)
+        self.pending = []
+
+
+def _assign_partition(db, query, user_orgs, batch_size, dry_run):
+    writer = _BatchWriter(db, batch_size, dry_run)
+    for doc in query.stream():
+        data = doc.to_dict()
+        if not data.get('orgId'):
+            writer.update(doc.reference, {'orgId': org_of(data, user_orgs)})
+    writer.flush()
+    return writer.written
+
+
+def _migrate_archive_month(db, month_doc, user_orgs, batch_size, dry_run):
+    """Tag archived records with orgId and rebuild the month's per-organization rollup documents"""
+    from archive import ARCHIVED_KINDS, ROLLUPS_COLLECTION, rollup_ref, rollup_totals
+    writer = _BatchWriter(db, batch_size, dry_run)
+    by_org = {}
+    for kind in ARCHIVED_KINDS:
+        for doc in month_doc.reference.collection(kind).stream():
+            data = doc.to_dict()
+            org_id = org_of(data, user_orgs)
+            if not data.get('orgId'):
+                writer.update(doc.reference, {'orgId': org_id})
+            by_org.setdefault(org_id, {}).setdefault(kind, []).append(data)
+    writer.flush()
+    if not dry_run:
+        for doc in month_doc.reference.collection(ROLLUPS_COLLECTION).stream():
+            if doc.id not in by_org:
+                doc.reference.delete()
+        for org_id, kinds in by_org.items():
+            rollup = {kind: rollup_totals(kind, records) for kind, records in kinds.items()}
+            rollup_ref(db, month_doc.id, org_id).set(
+                dict(rollup, month=month_doc.id, orgId=org_id, updatedAt=datetime.now()))
+        # Month documents used to carry every organization's totals in an `orgs` map
+        month_doc.reference.set({'month': month_doc.id, 'updatedAt': datetime.now()})
+    return writer.written
+
+
+def migrate(db, partitions=8, workers=8, batch_size=400, dry_run=False):
+    from partitions import partition_queries
+    stats = {}
+    user_orgs = {}
+    users_without_org = []
+    for doc in db.collection('users').stream():
+        data = doc.to_dict()
+        org_id = user_org(data)
+        if org_id:
+            user_orgs[doc.id] = org_id
+        # Unassigned signups (orgId: null) are left for an admin to assign
+        if 'orgId' not in data:
+            users_without_org.append(doc.reference)
+    writer = _BatchWriter(db, batch_size, dry_run)
+    for ref in users_without_org:
+        writer.update(ref, {'orgId': DEFAULT_ORG_ID})
+    writer.flush()
+    stats['users'] = writer.written
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for collection in SCOPED_COLLECTIONS:
+            queries = partition_queries(db.collection(collection), partitions)
+            stats[collection] = sum(pool.map(
+                lambda q: _assign_partition(db, q, user_orgs, batch_size, dry_run), queries))
+        months = list(db.collection('archive').stream())
+        stats['archived'] = sum(pool.map(
+            lambda m: _migrate_archive_month(db, m, user_orgs, batch_size, dry_run), months))
+    return stats
+
+
+def main():
+    from partitions import partition_count
+    parser = argparse.ArgumentParser(description='Assign orgId to existing users, invoices and transactions')
+    parser.add_argument('--partitions', type=partition_count, default=8,
+                        help='id-range partitions per collection (at most 62)')
+    parser.add_argument('--workers', type=int, default=8, help='partitions migrated in parallel')
+    parser.add_argument('--batch-size', type=int, default=400, help='updates per batch commit (max 500)')
+    parser.add_argument('--dry-run', action='store_true', help='count documents without updating them')
+    args = parser.parse_args()
+
+    from app import db
+    if db is None:
+        print("❌ Firebase is not initialized")
+        return 1
+
+    print(f"🏢 Migrating documents to organizations (default: {DEFAULT_ORG_ID})...")
+    stats = migrate(db, args.partitions, args.workers, min(args.batch_size, 500), args.dry_run)
+    verb = 'Would update' if args.dry_run else 'Updated'
+    for name, count in stats.items():
+        print(f"   {verb} {count} {name}")
+    print("✅ Migration complete!")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+"""
+Split a Firestore collection into document-id ranges and scan them in parallel.
+
+Auto-generated Firestore ids are 20 characters drawn uniformly from
+[0-9A-Za-z], so cutting that alphabet into equal slices gives evenly sized
+partitions without any extra reads. The first and last ranges are open-ended,
+which keeps documents with custom ids (e.g. counters) covered as well.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Byte order, which is the order Firestore sorts document ids in
+AUTO_ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+# Ranges are cut at single id characters, so there can't be more of them than characters
+MAX_PARTITIONS = len(AUTO_ID_ALPHABET)
+
+
+def partition_count(text):
+    """argparse type for --partitions"""
+    value = int(text)
+    if not 1 <= value <= MAX_PARTITIONS:
+        raise argparse.ArgumentTypeError(f'must be between 1 and {MAX_PARTITIONS}')
+    return value
+
+
+def id_range_bounds(count):
+    """
+    [(start, end), ...] id ranges covering the whole keyspace; None means unbounded.
+    count is clamped to 1..MAX_PARTITIONS, so callers should use the length of the result.
+    """
+    count = max(1, min(count, MAX_PARTITIONS))
+    cuts = [AUTO_ID_ALPHABET[len(AUTO_ID_ALPHABET) * i // count] for i in range(1, count)]
+    starts = [None] + cuts
+    ends = cuts + [None]
+    return list(zip(starts, ends))
+
+
+def partition_queries(collection_ref, count):
+    """One query per id range of collection_ref"""
+    queries = []
+    for start, end in id_range_bounds(count):
+        query = collection_ref
+        if start is not None:
+            query = query.where('__name__', '>=', collection_ref.document(start))
+        if end is not None:
+            query = query.where('__name__', '<', collection_ref.document(end))
+        queries.append(query)
+    return queries
+
+
+def scan_partitions(collection_ref, handle, partitions=8, workers=8):
+    """
+    Run handle(query) for every partition of collection_ref on a thread pool.
+    Returns (results in partition order, elapsed seconds).
+    """
+    started = time.perf_counter()
+    queries = partition_queries(collection_ref, partitions)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(handle, queries))
+    return results, time.perf_counter() - started
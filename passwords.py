@@ -0,0 +1,168 @@
+"""
+Password hashing for the auth endpoints and admin scripts.
+
+Hashes are stored as self-describing strings, so cost settings can change
+without breaking existing users:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+Legacy unsalted SHA-256 hex digests are still accepted; login re-hashes any
+password whose stored hash is legacy or uses other settings than the current
+ones (see needs_rehash). Logins for unknown emails verify against dummy_hash(),
+so they take as long as a wrong password for an existing account.
+
+Key derivation runs on a bounded pool (PASSWORD_HASH_WORKERS threads, or
+processes with PASSWORD_HASH_POOL=process) so request threads only wait on it.
+When PASSWORD_HASH_MAX_QUEUE hashes are already waiting for a worker, new ones
+fail fast with HasherBusy instead of queueing behind a burst of logins.
+
+Benchmark the cost settings with `python bench_passwords.py`.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def derive(algorithm, params, password, salt):
+    """Raw key for a password; module-level so a process pool can run it"""
+    if algorithm == 'scrypt':
+        n, r, p = params
+        # scrypt needs 128 * r * (n + p + 2) bytes; hashlib's default cap is 32 MiB
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+                              maxmem=128 * r * (n + p + 2) + (1 << 20))
+    if algorithm == 'pbkdf2_sha256':
+        iterations, = params
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=KEY_BYTES)
+    raise ValueError(f'Unknown password hash algorithm: {algorithm}')
+
+
+def parse_hash(stored):
+    """(algorithm, params, salt, key) of a stored hash; algorithm is 'sha256' for legacy digests"""
+    if not isinstance(stored, str):
+        raise ValueError('Password hash must be a string')
+    parts = stored.split('$')
+    if parts[0] == 'scrypt' and len(parts) == 6:
+        return 'scrypt', tuple(int(v) for v in parts[1:4]), _unb64(parts[4]), _unb64(parts[5])
+    if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+        return 'pbkdf2_sha256', (int(parts[1]),), _unb64(parts[2]), _unb64(parts[3])
+    if len(parts) == 1 and len(stored) == 64:
+        return 'sha256', (), b'', stored
+    raise ValueError('Unrecognized password hash format')
+
+
+def format_hash(algorithm, params, salt, key):
+    return '$'.join([algorithm, *(str(v) for v in params), _b64(salt), _b64(key)])
+
+
+def settings_from_env():
+    """(algorithm, params) for new hashes"""
+    algorithm = os.getenv('PASSWORD_HASH_ALGORITHM', 'scrypt').lower()
+    if algorithm == 'pbkdf2_sha256':
+        return algorithm, (int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '600000')),)
+    return 'scrypt', (int(os.getenv('PASSWORD_SCRYPT_N', '16384')),
+                      int(os.getenv('PASSWORD_SCRYPT_R', '8')),
+                      int(os.getenv('PASSWORD_SCRYPT_P', '1')))
+
+
+class PasswordHasher:
+    def __init__(self, algorithm=None, params=None, workers=None, max_queue=None, pool=None):
+        if algorithm is None:
+            algorithm, params = settings_from_env()
+        self.algorithm = algorithm
+        self.params = tuple(params)
+        self.workers = int(workers or os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv('PASSWORD_HASH_MAX_QUEUE', '32'))
+        pool = (pool or os.getenv('PASSWORD_HASH_POOL', 'thread')).lower()
+        # hashlib releases the GIL while deriving, so threads use every core without process overhead
+        executor = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+        self._executor = executor(max_workers=self.workers)
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._dummy = None
+        self._dummy_lock = threading.Lock()
+
+    def _derive(self, algorithm, params, password, salt):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many password checks in progress, please retry')
+        try:
+            return self._executor.submit(derive, algorithm, params, password, salt).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        return format_hash(self.algorithm, self.params, salt, self._derive(self.algorithm, self.params, password, salt))
+
+    def verify(self, password, stored):
+        try:
+            algorithm, params, salt, key = parse_hash(stored)
+        except ValueError:
+            return False
+        if algorithm == 'sha256':
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), key)
+        return hmac.compare_digest(self._derive(algorithm, params, password, salt), key)
+
+    def dummy_hash(self):
+        """Hash of a random password with the current settings, made once"""
+        with self._dummy_lock:
+            if self._dummy is None:
+                self._dummy = self.hash(secrets.token_urlsafe(16))
+            return self._dummy
+
+    def needs_rehash(self, stored):
+        try:
+            algorithm, params, _, _ = parse_hash(stored)
+        except ValueError:
+            return True
+        return (algorithm, params) != (self.algorithm, self.params)
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+_default_hasher = None
+_default_lock = threading.Lock()
+
+
+def default_hasher():
+    global _default_hasher
+    with _default_lock:
+        if _default_hasher is None:
+            _default_hasher = PasswordHasher()
+        return _default_hasher
+
+
+def hash_password(password):
+    return default_hasher().hash(password)
+
+
+def verify_password(password, stored):
+    return default_hasher().verify(password, stored)
+
+
+def needs_rehash(stored):
+    return default_hasher().needs_rehash(stored)
+
+
+def dummy_hash():
+    return default_hasher().dummy_hash()
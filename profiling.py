@@ -0,0 +1,212 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries a valid signed X-Profile-Request header
+(issued to admins by POST /api/admin/profiles/token) or when it is picked by
+1-in-PROFILE_SAMPLE_EVERY sampling. The profile is written to PROFILE_DIR as a
+collapsed-stack file ("frame;frame;frame weight" per line, weights in
+microseconds) that flamegraph.pl, speedscope or inferno can render directly,
+plus a small JSON summary with the time split between Firestore calls, JSON
+serialization and the rest of the handler.
+
+PROFILE_MODE selects the profiler:
+    sampling       - a background thread samples the request thread's stack
+                     every PROFILE_INTERVAL_MS (low overhead, default)
+    deterministic  - sys.setprofile records every call (exact, much slower)
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+PROFILE_HEADER = 'X-Profile-Request'
+
+# Frames from these paths count towards the Firestore / serialization phases
+FIRESTORE_MARKERS = (os.sep + 'google' + os.sep + 'cloud' + os.sep + 'firestore', os.sep + 'grpc' + os.sep)
+SERIALIZATION_MARKERS = ('json_provider.py', os.sep + 'json' + os.sep, 'orjson')
+
+
+def frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def classify(filenames):
+    """Phase for a stack, given its frame filenames outermost first"""
+    for filename in reversed(filenames):
+        if any(marker in filename for marker in FIRESTORE_MARKERS):
+            return 'firestore'
+        if any(marker in filename for marker in SERIALIZATION_MARKERS):
+            return 'serialization'
+    return 'handler'
+
+
+class _Profile:
+    """Collapsed stacks and per-phase totals (both in microseconds)"""
+
+    def __init__(self):
+        self.stacks = {}
+        self.phases = {'firestore': 0, 'serialization': 0, 'handler': 0}
+
+    def add(self, labels, filenames, micros):
+        key = ';'.join(labels)
+        self.stacks[key] = self.stacks.get(key, 0) + micros
+        self.phases[classify(filenames)] += micros
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.profile = _Profile()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        target = threading.get_ident()
+
+        def run():
+            last = time.perf_counter()
+            while not self._stop.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                now = time.perf_counter()
+                if frame is not None:
+                    labels, filenames = [], []
+                    while frame is not None:
+                        labels.append(frame_label(frame.f_code))
+                        filenames.append(frame.f_code.co_filename)
+                        frame = frame.f_back
+                    labels.reverse()
+                    filenames.reverse()
+                    self.profile.add(labels, filenames, int((now - last) * 1e6))
+                last = now
+
+        self._thread = threading.Thread(target=run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.profile
+
+
+class DeterministicProfiler:
+    def __init__(self):
+        self.profile = _Profile()
+        # (label, filename, started, child_time)
+        self._stack = []
+
+    def _hook(self, frame, event, arg):
+        if event in ('call', 'c_call'):
+            if event == 'c_call':
+                label, filename = f"builtin:{getattr(arg, '__qualname__', arg)}", getattr(arg, '__module__', '') or ''
+            else:
+                label, filename = frame_label(frame.f_code), frame.f_code.co_filename
+            self._stack.append([label, filename, time.perf_counter(), 0.0])
+        elif event in ('return', 'c_return', 'c_exception') and self._stack:
+            label, filename, started, child_time = self._stack[-1]
+            elapsed = time.perf_counter() - started
+            self.profile.add([entry[0] for entry in self._stack], [entry[1] for entry in self._stack],
+                             int((elapsed - child_time) * 1e6))
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][3] += elapsed
+
+    def start(self):
+        sys.setprofile(self._hook)
+
+    def stop(self):
+        sys.setprofile(None)
+        return self.profile
+
+
+class ProfileStore:
+    """Profiles on local disk, newest PROFILE_MAX_FILES kept"""
+
+    def __init__(self, directory=None, max_files=None):
+        self.directory = directory or os.getenv('PROFILE_DIR', '/tmp/financeflow-profiles')
+        self.max_files = int(max_files or os.getenv('PROFILE_MAX_FILES', '200'))
+
+    def save(self, profile, summary):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        with open(os.path.join(self.directory, name + '.collapsed'), 'w') as f:
+            for stack, micros in sorted(profile.stacks.items()):
+                if micros > 0:
+                    f.write(f"{stack} {micros}\n")
+        summary = dict(summary, name=name, file=name + '.collapsed',
+                       phasesMs={k: round(v / 1000, 3) for k, v in profile.phases.items()})
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(summary, f)
+        self._prune()
+        return summary
+
+    def _prune(self):
+        summaries = sorted(n for n in os.listdir(self.directory) if n.endswith('.json'))
+        for old in summaries[:-self.max_files]:
+            for ext in ('.json', '.collapsed'):
+                try:
+                    os.remove(os.path.join(self.directory, old[:-5] + ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return summaries
+
+
+class RequestProfiling:
+    """Decides which requests to profile and runs the chosen profiler around them"""
+
+    def __init__(self, secret, store=None):
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.store = store or ProfileStore()
+        self.mode = os.getenv('PROFILE_MODE', 'sampling').lower()
+        self.sample_every = int(os.getenv('PROFILE_SAMPLE_EVERY', '0'))
+        self.interval = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+        self._counter = itertools.count(1)
+
+    def _signature(self, expires):
+        return hmac.new(self.secret, f'profile:{expires}'.encode(), hashlib.sha256).hexdigest()
+
+    def issue_token(self, ttl_seconds=600):
+        expires = int(time.time()) + int(ttl_seconds)
+        return f"{expires}.{self._signature(expires)}"
+
+    def token_valid(self, token):
+        expires, _, signature = (token or '').partition('.')
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        return hmac.compare_digest(signature, self._signature(int(expires)))
+
+    def should_profile(self, headers):
+        if PROFILE_HEADER in headers:
+            return self.token_valid(headers.get(PROFILE_HEADER))
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    def start(self):
+        profiler = DeterministicProfiler() if self.mode == 'deterministic' else SamplingProfiler(self.interval)
+        profiler.start()
+        return profiler, time.perf_counter()
+
+    def finish(self, running, summary):
+        profiler, started = running
+        profile = profiler.stop()
+        summary = dict(summary, mode=self.mode, durationMs=round((time.perf_counter() - started) * 1000, 3),
+                       recordedAt=datetime.now().isoformat())
+        return self.store.save(profile, summary)
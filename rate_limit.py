@@ -0,0 +1,135 @@
+"""
+Admission control for the auth endpoints.
+
+Each login/signup request must take a token from a per-IP bucket and a
+per-email bucket, and must get one of AUTH_MAX_CONCURRENT slots. Requests that
+fail any check are rejected immediately with 429 instead of queueing behind
+Firestore, so a credential-stuffing burst can't exhaust the Firestore quota.
+
+Bucket state is kept by a pluggable backend:
+    memory  - per-process LRU of at most 100000 buckets (default)
+    sqlite  - a local SQLite file, shared by every worker process on the host
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_file import SQLiteFile
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process, at most max_keys of them (least recently used evicted)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, refill_per_second, now=None):
+        """Take one token; returns (allowed, seconds_until_next_token)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / refill_per_second
+
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file so several workers share one view"""
+
+    # Drop buckets untouched for an hour roughly every this many calls
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.file = SQLiteFile(path, 'CREATE TABLE IF NOT EXISTS buckets '
+                                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def take(self, key, capacity, refill_per_second, now=None):
+        now = time.time() if now is None else now
+        conn = self.file.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0, now - updated) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if self.file.prune_due(self.PRUNE_EVERY):
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / refill_per_second
+
+
+def bucket_store_from_env():
+    backend = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        return SQLiteBucketStore(os.getenv('RATE_LIMIT_SQLITE_PATH', '/tmp/financeflow-ratelimit.db'))
+    return MemoryBucketStore()
+
+
+class AdmissionController:
+    def __init__(self, store=None, per_ip_per_minute=None, per_email_per_minute=None, max_concurrent=None):
+        self.store = store or bucket_store_from_env()
+        self.per_ip = int(per_ip_per_minute or os.getenv('RATE_LIMIT_IP_PER_MINUTE', '20'))
+        self.per_email = int(per_email_per_minute or os.getenv('RATE_LIMIT_EMAIL_PER_MINUTE', '5'))
+        self.max_concurrent = int(max_concurrent or os.getenv('AUTH_MAX_CONCURRENT', '8'))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'admitted': 0, 'limited_ip': 0, 'limited_email': 0, 'shed': 0, 'in_flight': 0}
+
+    def _count(self, name, delta=1):
+        with self._metrics_lock:
+            self._metrics[name] += delta
+
+    def check(self, ip, email):
+        """Returns (reason, retry_after) when the request must be rejected, else None"""
+        if ip:
+            allowed, retry_after = self.store.take(f'ip:{ip}', self.per_ip, self.per_ip / 60)
+            if not allowed:
+                self._count('limited_ip')
+                return 'Too many requests from this address', retry_after
+        if email:
+            allowed, retry_after = self.store.take(f'email:{email}', self.per_email, self.per_email / 60)
+            if not allowed:
+                self._count('limited_email')
+                return 'Too many attempts for this account', retry_after
+        return None
+
+    def acquire(self):
+        """Take a concurrency slot without waiting; False means shed the request"""
+        if not self._slots.acquire(blocking=False):
+            self._count('shed')
+            return False
+        self._count('admitted')
+        self._count('in_flight')
+        return True
+
+    def release(self):
+        self._count('in_flight', -1)
+        self._slots.release()
+
+    def metrics(self):
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        snapshot.update({
+            'backend': type(self.store).__name__,
+            'per_ip_per_minute': self.per_ip,
+            'per_email_per_minute': self.per_email,
+            'max_concurrent': self.max_concurrent
+        })
+        return snapshot
@@ -0,0 +1,321 @@
+"""
+Financial reports served from /api/reports/*.
+
+Accounts-receivable aging
+    Each organization has a summary document (aging_summaries/{orgId}) holding
+    the outstanding amount and invoice count per (client, due date) of its
+    unpaid invoices. The invoice endpoints update it in the same transaction
+    that writes the invoice, so every instance reads the same current totals
+    with one document read. Bucketing by days past due happens at request time,
+    so the report is always as of today. The summary is rebuilt from an indexed
+    query on (orgId, status, dueDate) when it is missing, and every
+    AGING_REBUILD_SECONDS to fold in changes written to Firestore directly.
+
+GST summary
+    Invoice line items in a date range are flattened into columns (HSN code,
+    SGST/CGST rate and taxable value in integer paise) and summed per
+    (HSN, rate) group with NumPy grouped reductions when NumPy is installed
+    (plain Python otherwise). Working in integer paise keeps the sums exact;
+    tax is then computed per group with Decimal ROUND_HALF_UP to the paisa.
+    Also available from the command line:
+
+        python reports.py gst-summary --org default --from 2026-04-01 --to 2026-06-30 [--output q1.csv]
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from money import CENT, to_decimal, to_paise
+from organizations import DEFAULT_ORG_ID
+
+try:
+    from firebase_admin import firestore
+except Exception:
+    firestore = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+UNPAID_STATUSES = ['Pending', 'Overdue']
+# (label, min days past due, max days past due); 'current' is not yet due
+AGING_BUCKETS = [('current', None, -1), ('0-30', 0, 30), ('31-60', 31, 60), ('61-90', 61, 90), ('90+', 91, None)]
+AGING_COLLECTION = 'aging_summaries'
+
+
+def parse_due_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def aging_bucket(days_past_due):
+    for label, low, high in AGING_BUCKETS:
+        if (low is None or days_past_due >= low) and (high is None or days_past_due <= high):
+            return label
+
+
+def open_item(invoice):
+    """(client, due date, outstanding paise) of an unpaid invoice, or None when it isn't receivable"""
+    if not invoice or invoice.get('status') not in UNPAID_STATUSES:
+        return None
+    due = parse_due_date(invoice.get('dueDate'))
+    if due is None:
+        return None
+    return invoice.get('clientName') or 'Unknown client', due, to_paise(invoice.get('grandTotal') or invoice.get('amount'))
+
+
+def entry_key(client, due):
+    # Client names can hold any character, which Firestore map keys used in field paths can't
+    return hashlib.sha1(f'{client}\n{due.isoformat()}'.encode()).hexdigest()[:20]
+
+
+def apply_change(entries, old_invoice, new_invoice):
+    """Move an invoice's outstanding amount in summary entries from its old state to its new one (None: absent)"""
+    for invoice, sign in ((old_invoice, -1), (new_invoice, 1)):
+        item = open_item(invoice)
+        if item is None:
+            continue
+        client, due, paise = item
+        key = entry_key(client, due)
+        entry = entries.setdefault(key, {'clientName': client, 'dueDate': due.isoformat(), 'amount': 0, 'invoices': 0})
+        entry['amount'] += sign * paise
+        entry['invoices'] += sign
+        if entry['invoices'] <= 0:
+            del entries[key]
+    return entries
+
+
+def aging_rows(entries, as_of):
+    """The aging report of summary entries, bucketed by days past due as of a date"""
+    labels = [label for label, _, _ in AGING_BUCKETS]
+    clients = {}
+    totals = dict.fromkeys(labels, 0)
+    count = 0
+    for entry in entries.values():
+        label = aging_bucket((as_of - parse_due_date(entry['dueDate'])).days)
+        row = clients.setdefault(entry['clientName'], dict(dict.fromkeys(labels, 0), invoices=0))
+        row[label] += entry['amount']
+        row['invoices'] += entry['invoices']
+        totals[label] += entry['amount']
+        count += entry['invoices']
+
+    def rupees(paise):
+        return (Decimal(paise) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    rows = []
+    for client, row in sorted(clients.items()):
+        rows.append(dict({label: rupees(row[label]) for label in labels},
+                         clientName=client, invoices=row['invoices'], total=rupees(sum(row[label] for label in labels))))
+    return {
+        'asOf': as_of.isoformat(),
+        'buckets': labels,
+        'clients': rows,
+        'totals': dict({label: rupees(totals[label]) for label in labels},
+                       total=rupees(sum(totals.values())), invoices=count)
+    }
+
+
+class AgingReport:
+    def __init__(self, db, rebuild_seconds=None):
+        self.db = db
+        self.rebuild_seconds = int(rebuild_seconds or os.getenv('AGING_REBUILD_SECONDS', '3600'))
+
+    def summary_ref(self, org_id):
+        return self.db.collection(AGING_COLLECTION).document(org_id)
+
+    def read(self, transaction, org_id):
+        """
+        Entries of the organization's summary, read in the caller's transaction
+        before its writes; None while the summary hasn't been built
+        """
+        snapshot = self.summary_ref(org_id).get(transaction=transaction)
+        return dict(snapshot.to_dict().get('entries') or {}) if snapshot.exists else None
+
+    def record(self, transaction, org_id, entries, old_invoice, new_invoice):
+        """Write the invoice's change to the summary read with read(); the next rebuild covers unbuilt ones"""
+        if entries is None:
+            return
+        apply_change(entries, old_invoice, new_invoice)
+        transaction.update(self.summary_ref(org_id), {'entries': entries, 'updatedAt': datetime.now()})
+
+    def rebuild(self, org_id):
+        """Recompute the summary from the organization's unpaid invoices; returns its entries"""
+        query = (self.db.collection('invoices')
+                 .where('orgId', '==', org_id)
+                 .where('status', 'in', UNPAID_STATUSES)
+                 .order_by('dueDate'))
+        summary_ref = self.summary_ref(org_id)
+
+        # Reading the invoices in the transaction keeps invoice writes from slipping in between
+        @firestore.transactional
+        def write(transaction):
+            entries = {}
+            for doc in transaction.get(query):
+                apply_change(entries, None, doc.to_dict())
+            transaction.set(summary_ref, {
+                'orgId': org_id,
+                'entries': entries,
+                'rebuiltAt': datetime.now(timezone.utc),
+                'updatedAt': datetime.now()
+            })
+            return entries
+
+        return write(self.db.transaction())
+
+    def _stale(self, summary):
+        if self.rebuild_seconds <= 0:
+            return False
+        rebuilt_at = summary.get('rebuiltAt')
+        return rebuilt_at is None or datetime.now(timezone.utc) - rebuilt_at > timedelta(seconds=self.rebuild_seconds)
+
+    def build(self, org_id, as_of=None):
+        snapshot = self.summary_ref(org_id).get()
+        summary = snapshot.to_dict() if snapshot.exists else None
+        if summary is None or self._stale(summary):
+            entries = self.rebuild(org_id)
+        else:
+            entries = summary.get('entries') or {}
+        return aging_rows(entries, as_of or date.today())
+
+
+GST_COLUMNS = ['hsnCode', 'sgstRate', 'cgstRate', 'lineItems', 'quantity',
+               'taxableValue', 'sgstAmount', 'cgstAmount', 'totalTax']
+
+
+def format_rate(value):
+    """Plain decimal text of a tax rate: 9 -> '9', 2.50 -> '2.5', 10 -> '10' (never '1E+1')"""
+    return format(to_decimal(value).normalize(), 'f')
+
+
+def flatten_line_items(invoices):
+    """
+    Columnar view of every line item: (groups, codes, quantity, paise), where
+    codes[i] indexes the line's (hsn, sgst_rate, cgst_rate) tuple in groups
+    """
+    group_codes = {}
+    codes, quantity, paise = [], [], []
+    for invoice in invoices:
+        sgst_rate = format_rate(invoice.get('sgstRate'))
+        cgst_rate = format_rate(invoice.get('cgstRate'))
+        for item in invoice.get('items') or []:
+            key = (str(item.get('hsnCode') or '').strip() or 'UNSPECIFIED', sgst_rate, cgst_rate)
+            codes.append(group_codes.setdefault(key, len(group_codes)))
+            quantity.append(float(item.get('quantity') or 0))
+            paise.append(to_paise(item.get('amount')))
+    return list(group_codes), codes, quantity, paise
+
+
+def _reduce_numpy(group_count, codes, quantity, paise):
+    codes = np.asarray(codes, dtype=np.intp)
+    lines = np.bincount(codes, minlength=group_count)
+    quantities = np.bincount(codes, weights=np.asarray(quantity, dtype=np.float64), minlength=group_count)
+    # Integer accumulation so paise sums stay exact
+    taxable = np.zeros(group_count, dtype=np.int64)
+    np.add.at(taxable, codes, np.asarray(paise, dtype=np.int64))
+    return lines.tolist(), quantities.tolist(), taxable.tolist()
+
+
+def _reduce_python(group_count, codes, quantity, paise):
+    lines, quantities, taxable = [0] * group_count, [0.0] * group_count, [0] * group_count
+    for code, qty, value in zip(codes, quantity, paise):
+        lines[code] += 1
+        quantities[code] += qty
+        taxable[code] += value
+    return lines, quantities, taxable
+
+
+def gst_summary(invoices):
+    """Rows of taxable value and SGST/CGST per (HSN code, SGST rate, CGST rate)"""
+    groups, codes, quantity, paise = flatten_line_items(invoices)
+    if not groups:
+        return []
+    reduce = _reduce_numpy if np is not None else _reduce_python
+    totals = zip(groups, *reduce(len(groups), codes, quantity, paise))
+    rows = []
+    for (hsn, sgst_rate, cgst_rate), lines, qty, value in sorted(totals):
+        taxable = Decimal(value) / 100
+        sgst_amount = (taxable * Decimal(sgst_rate) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        cgst_amount = (taxable * Decimal(cgst_rate) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        rows.append({
+            'hsnCode': hsn,
+            'sgstRate': Decimal(sgst_rate),
+            'cgstRate': Decimal(cgst_rate),
+            'lineItems': lines,
+            'quantity': round(qty, 3),
+            'taxableValue': taxable.quantize(CENT),
+            'sgstAmount': sgst_amount,
+            'cgstAmount': cgst_amount,
+            'totalTax': sgst_amount + cgst_amount
+        })
+    return rows
+
+
+def load_invoices_between(db, org_id, date_from, date_to):
+    """An organization's hot and archived invoices dated within the inclusive YYYY-MM-DD range"""
+    from archive import load_archived
+    query = (db.collection('invoices').where('orgId', '==', org_id)
+             .where('date', '>=', date_from).where('date', '<=', date_to))
+    invoices = [doc.to_dict() for doc in query.stream()]
+    invoices.extend(load_archived(db, 'invoices', date_from, date_to, org_id))
+    return invoices
+
+
+def iter_csv(rows):
+    """CSV text in chunks, header first, suitable for a streamed response"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=GST_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % 1000 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FinanceFlow reports')
+    subcommands = parser.add_subparsers(dest='report', required=True)
+    gst = subcommands.add_parser('gst-summary', help='taxable value and SGST/CGST per HSN code and rate')
+    gst.add_argument('--org', default=DEFAULT_ORG_ID, help=f'organization id (default: {DEFAULT_ORG_ID})')
+    gst.add_argument('--from', dest='date_from', required=True, help='YYYY-MM-DD')
+    gst.add_argument('--to', dest='date_to', required=True, help='YYYY-MM-DD')
+    gst.add_argument('--output', help='CSV file (default: stdout)')
+    args = parser.parse_args()
+
+    from app import db
+    if db is None:
+        print("❌ Firebase is not initialized", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    invoices = load_invoices_between(db, args.org, args.date_from, args.date_to)
+    rows = gst_summary(invoices)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in iter_csv(rows):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    print(f"✅ {len(invoices)} invoices, {sum(r['lineItems'] for r in rows)} line items, {len(rows)} HSN/rate groups "
+          f"in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,357 @@
+"""
+Shared cache for list and report responses.
+
+Each cached response is keyed by the request (path, query string, organization)
+plus the current version token of every collection it reads. Write endpoints
+bump the version of the collections they touch, which makes older entries
+unreachable; they then age out by RESULT_CACHE_TTL_SECONDS, which also bounds
+staleness for writes made directly from the browser. Version tokens are random,
+so a version lost to eviction can never resurrect an old entry.
+
+A cold key is computed once: the first request takes a short lock entry in the
+backend and computes, concurrent requests for the same key on any instance
+sharing the backend wait for its result (up to RESULT_CACHE_LOCK_SECONDS)
+instead of repeating the Firestore reads.
+
+Entries live in a pluggable backend chosen with RESULT_CACHE_BACKEND:
+    none    - caching disabled (default)
+    disk    - a local SQLite file, shared by every worker process on the host
+    redis   - any server speaking the Redis protocol at RESULT_CACHE_URL, shared by all instances
+    memory  - per-process LRU; only for a single worker process, since invalidation
+              from a write never reaches other processes or instances
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from flask import Response
+
+from sqlite_file import SQLiteFile
+
+# Response headers worth replaying from the cache besides the content type
+CACHED_HEADERS = ('Content-Disposition',)
+
+
+class MemoryCacheBackend:
+    """LRU dict of (expires, value) held in this process"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._live(key, now) for key in keys]
+
+    def _store(self, key, value, ttl, now):
+        self._entries[key] = (now + ttl if ttl else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    def add(self, key, value, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DiskCacheBackend:
+    """Entries in a local SQLite file so several workers share one cache"""
+
+    # Drop expired entries roughly every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path):
+        self.file = SQLiteFile(path, 'CREATE TABLE IF NOT EXISTS cache '
+                                     '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+
+    def get_many(self, keys):
+        now = time.time()
+        conn = self.file.connection()
+        values = []
+        for key in keys:
+            row = conn.execute('SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                               (key, now)).fetchone()
+            values.append(bytes(row[0]) if row else None)
+        return values
+
+    def _written(self, conn, now):
+        if self.file.prune_due(self.PRUNE_EVERY):
+            conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        conn = self.file.connection()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, value, now + ttl if ttl else None))
+        self._written(conn, now)
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        conn = self.file.connection()
+        cursor = conn.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, value, now + ttl if ttl else None, now))
+        self._written(conn, now)
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self.file.connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+class RedisCacheBackend:
+    """
+    Minimal client for the Redis protocol (GET/MGET/SET/DEL), so any compatible
+    server works without an extra dependency. One connection per thread.
+    """
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+            if self.password:
+                self._call('AUTH', self.password)
+            if self.database:
+                self._call('SELECT', self.database)
+        return conn
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f'Unexpected Redis reply: {line!r}')
+
+    def _call(self, *args):
+        sock, reader = self._connect()
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        try:
+            sock.sendall(b''.join(parts))
+            return self._read_reply(reader)
+        except (OSError, ConnectionError):
+            # Drop the broken connection so the next call reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def get_many(self, keys):
+        return self._call('MGET', *keys)
+
+    def _set_args(self, key, value, ttl):
+        return ('SET', key, value) + (('PX', int(ttl * 1000)) if ttl else ())
+
+    def set(self, key, value, ttl=None):
+        self._call(*self._set_args(key, value, ttl))
+
+    def add(self, key, value, ttl=None):
+        return self._call(*self._set_args(key, value, ttl), 'NX') is not None
+
+    def delete(self, key):
+        self._call('DEL', key)
+
+
+def cache_backend_from_env():
+    backend = os.getenv('RESULT_CACHE_BACKEND', 'none').lower()
+    if backend == 'disk':
+        return DiskCacheBackend(os.getenv('RESULT_CACHE_PATH', '/tmp/financeflow-cache.db'))
+    if backend == 'redis':
+        return RedisCacheBackend(os.getenv('RESULT_CACHE_URL', 'redis://localhost:6379/0'))
+    if backend == 'memory':
+        return MemoryCacheBackend(int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024')))
+    return None
+
+
+def encode_response(response):
+    meta = {'mimetype': response.mimetype,
+            'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}}
+    return json.dumps(meta).encode() + b'\n' + response.get_data()
+
+
+def decode_response(value):
+    meta, body = value.split(b'\n', 1)
+    meta = json.loads(meta)
+    return Response(body, mimetype=meta['mimetype'], headers=meta['headers'])
+
+
+class ResultCache:
+    POLL_SECONDS = 0.05
+
+    def __init__(self, backend, ttl_seconds=None, lock_seconds=None, prefix='rc'):
+        self.backend = backend
+        self.ttl = int(ttl_seconds or os.getenv('RESULT_CACHE_TTL_SECONDS', '60'))
+        self.lock_seconds = float(lock_seconds or os.getenv('RESULT_CACHE_LOCK_SECONDS', '10'))
+        self.prefix = prefix
+        # key -> Event of the computation in flight here, so threads of one instance
+        # wait for each other locally instead of polling the backend
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'waits': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._metrics_lock:
+            self._metrics[name] += 1
+
+    def metrics(self):
+        with self._metrics_lock:
+            return dict(self._metrics, backend=type(self.backend).__name__)
+
+    def _version_key(self, collection, org_id):
+        return f'{self.prefix}:v:{collection}:{org_id}'
+
+    def versions(self, collections, org_id):
+        """Current version tokens of each collection for the organization and for all organizations"""
+        keys = [self._version_key(c, scope) for c in collections for scope in (org_id, '*')]
+        tokens = self.backend.get_many(keys)
+        for i, token in enumerate(tokens):
+            if token is None:
+                self.backend.add(keys[i], uuid.uuid4().hex.encode())
+                tokens[i] = self.backend.get_many([keys[i]])[0]
+        return [t.decode() if isinstance(t, bytes) else t for t in tokens]
+
+    def invalidate(self, collections, org_id='*'):
+        """Bump versions so cached results reading these collections are no longer served"""
+        try:
+            for collection in collections:
+                self.backend.set(self._version_key(collection, org_id), uuid.uuid4().hex.encode())
+        except Exception as e:
+            self._count('errors')
+            print(f"⚠️ Result cache invalidation failed: {e}")
+
+    def key(self, collections, org_id, *parts):
+        material = json.dumps([org_id, self.versions(collections, org_id), *parts], default=str)
+        return f'{self.prefix}:r:{hashlib.sha256(material.encode()).hexdigest()}'
+
+    def _wait_for(self, key):
+        """Value computed by another instance, or None when its lock is released or expires first"""
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_SECONDS)
+            value, lock = self.backend.get_many([key, key + ':lock'])
+            if value is not None or lock is None:
+                return value
+        return None
+
+    def _lead(self, key, run):
+        """Compute key as this instance's only caller, unless another instance already is"""
+        if not self.backend.add(key + ':lock', b'1', self.lock_seconds):
+            self._count('waits')
+            value = self._wait_for(key)
+            if value is not None:
+                return value, True
+            self.backend.add(key + ':lock', b'1', self.lock_seconds)
+        self._count('misses')
+        try:
+            value = run()
+            if value is not None:
+                self.backend.set(key, value, self.ttl)
+        finally:
+            self.backend.delete(key + ':lock')
+        return value, False
+
+    def get_or_compute(self, collections, org_id, parts, compute):
+        """
+        (value, hit) for the request identified by parts. compute() returns the
+        bytes to cache, or None for a result that must not be cached; backend
+        failures fall back to computing directly.
+        """
+        computed = []
+
+        def run():
+            if not computed:
+                computed.append(compute())
+            return computed[0]
+
+        try:
+            key = self.key(collections, org_id, *parts)
+            value = self.backend.get_many([key])[0]
+            if value is not None:
+                self._count('hits')
+                return value, True
+            # Only callers of this same key wait; unrelated keys never share a lock
+            with self._flights_lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = threading.Event()
+            if not leader:
+                self._count('waits')
+                flight.wait(self.lock_seconds)
+                value = self.backend.get_many([key])[0]
+                if value is not None:
+                    return value, True
+                # Nothing cacheable came out of it; compute without caching
+                self._count('misses')
+                return run(), False
+            try:
+                return self._lead(key, run)
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                flight.set()
+        except (OSError, ConnectionError, RuntimeError, sqlite3.Error) as e:
+            self._count('errors')
+            print(f"⚠️ Result cache unavailable, computing directly: {e}")
+            return run(), False
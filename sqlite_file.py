@@ -0,0 +1,32 @@
+"""
+A SQLite file shared by the worker processes on one host, used by the sqlite
+rate-limit backend and the disk result-cache backend.
+
+Each thread gets its own autocommit connection in WAL mode, so readers don't
+block the writer. Expiry times stored in these files are wall-clock
+(time.time()), because monotonic clocks are not comparable across processes.
+"""
+
+import sqlite3
+import threading
+
+
+class SQLiteFile:
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self.connection().execute(schema)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def prune_due(self, every):
+        """Count a write; True roughly once every `every` writes of this process, to drop expired rows"""
+        self._writes += 1
+        return self._writes % every == 0
@@ -194,6 +194,7 @@ class AuthManager {
                 email: email,
                 role: 'User',
                 status: 'pending',
+                orgId: null, // Assigned by an admin; no data access until then
                 createdAt: new Date()
             });
             
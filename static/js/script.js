@@ -13,6 +13,8 @@ const formatINR = (amount) => {
 let currentPeriod = 'monthly';
 let currentEditingInvoiceId = null;
 let invoicesData = [];
+// Monthly totals of invoices and transactions moved to the archive (archive/{month}/rollups/{orgId})
+let archiveRollups = [];
 let accountsData = {
   "Employee Payment": [],
   "Allowance": [],
@@ -160,6 +162,7 @@ if (signupForm) {
         secretCode: secretCode, // In production, hash this!
         status: "pending", // Default status
         role: "User", // Default role
+        orgId: null, // Assigned by an admin; no data access until then
         createdAt: new Date()
       };
 
@@ -301,12 +304,38 @@ async function checkUserStatus() {
 // --- FIREBASE INTEGRATION AND DATA MANAGEMENT ---
 
 // Import Firestore functions
-import { collection, addDoc, getDocs, updateDoc, doc, deleteDoc, query, where, getDoc, orderBy, startAfter, limit } from "https://www.gstatic.com/firebasejs/9.6.10/firebase-firestore.js";
+import { collection, collectionGroup, addDoc, getDocs, updateDoc, doc, deleteDoc, query, where, getDoc, orderBy, startAfter, limit } from "https://www.gstatic.com/firebasejs/9.6.10/firebase-firestore.js";
+
+// Organization of the signed-in user. The Firestore rules only allow reads and writes of
+// documents carrying this orgId, so every invoice/transaction query and create is scoped to it.
+function currentOrgId() {
+  return (currentUser && currentUser.orgId) || null;
+}
+
+// Call the Flask API with the Firebase ID token of the signed-in user (or the session cookie).
+// Throws an Error carrying the HTTP status and the server's error message on failure.
+async function apiRequest(path, options = {}) {
+  const headers = { 'Content-Type': 'application/json', ...(options.headers || {}) };
+  const firebaseUser = window.firebaseAuth && window.firebaseAuth.currentUser;
+  if (firebaseUser) {
+    headers['Authorization'] = `Bearer ${await firebaseUser.getIdToken()}`;
+  }
+  const response = await fetch(`/api${path}`, { ...options, headers, credentials: 'include' });
+  const data = await response.json().catch(() => ({}));
+  if (!response.ok) {
+    const error = new Error(data.error || `Request failed with status ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+  return data;
+}
 
 // Data calculation functions
 function calculateFinancialMetrics() {
-    // Calculate metrics from actual invoice and transaction data
-    const totalRevenue = invoicesData.filter(inv => inv.status === 'Paid').reduce((sum, inv) => sum + (inv.grandTotal || inv.amount || 0), 0);
+    // Calculate metrics from actual invoice and transaction data, plus the archived months' rollups
+    // (only paid invoices are archived, so they only add to revenue)
+    const archivedRevenue = archiveRollups.reduce((sum, r) => sum + ((r.invoices && r.invoices.grandTotal) || 0), 0);
+    const totalRevenue = archivedRevenue + invoicesData.filter(inv => inv.status === 'Paid').reduce((sum, inv) => sum + (inv.grandTotal || inv.amount || 0), 0);
     const outstandingInvoices = invoicesData.filter(inv => inv.status !== 'Paid').reduce((sum, inv) => sum + (inv.grandTotal || inv.amount || 0), 0);
     
     // Calculate expenses from all expense categories
@@ -316,6 +345,14 @@ function calculateFinancialMetrics() {
             totalExpenses += accountsData[category].reduce((sum, transaction) => sum + Math.abs(transaction.amount), 0);
         }
     });
+    archiveRollups.forEach(rollup => {
+        const byCategory = (rollup.transactions && rollup.transactions.byCategory) || {};
+        Object.keys(byCategory).forEach(category => {
+            if (category !== 'Miscellaneous Income') {
+                totalExpenses += Math.abs(byCategory[category]);
+            }
+        });
+    });
     
     const netProfit = totalRevenue - totalExpenses;
     
@@ -353,38 +390,53 @@ function calculateFinancialMetrics() {
 }
 
 // --- INVOICES ---
+// Idempotency-Key of the invoice being created, kept until the server answers so that
+// submitting the same form again after a failed request can't create the invoice twice
+let pendingInvoiceKey = null;
+
+// Invoices are written through the API, which assigns the invoice number for the financial year
 window.saveInvoice = async function (invoice) {
+  // The server owns the id, number, organization and timestamps
+  const { id, docId, createdAt, ...fields } = invoice;
   try {
-    if (invoice.id && invoice.id.startsWith('INV-')) {
+    if (id) {
       // Update existing invoice
-      const invoicesRef = collection(window.firestoreDb, "invoices");
-      const q = query(invoicesRef, where("invoiceNumber", "==", invoice.id));
-      const querySnapshot = await getDocs(q);
-      
-      if (!querySnapshot.empty) {
-        const docRef = querySnapshot.docs[0].ref;
-        await updateDoc(docRef, invoice);
-        console.log("✅ Invoice updated:", invoice.id);
-      }
+      await apiRequest(`/invoices/${encodeURIComponent(id)}`, { method: 'PUT', body: JSON.stringify(fields) });
+      console.log("✅ Invoice updated:", id);
+      showNotification('Invoice saved successfully', 'success');
     } else {
       // Create new invoice
-      const docRef = await addDoc(collection(window.firestoreDb, "invoices"), invoice);
-      console.log("✅ Invoice saved with ID:", docRef.id);
+      pendingInvoiceKey = pendingInvoiceKey || crypto.randomUUID();
+      const created = await apiRequest('/invoices', {
+        method: 'POST',
+        headers: { 'Idempotency-Key': pendingInvoiceKey },
+        body: JSON.stringify(fields)
+      });
+      pendingInvoiceKey = null;
+      console.log("✅ Invoice saved with ID:", created.id);
+      showNotification(`Invoice ${created.invoiceNumber} created`, 'success');
     }
     window.loadInvoices(); // Reload the list
     calculateFinancialMetrics(); // Recalculate metrics
     updateCharts(currentPeriod); // Update charts
     closeInvoiceModal();
-    showNotification('Invoice saved successfully', 'success');
   } catch (e) {
     console.error("❌ Error saving invoice:", e);
-    showNotification('Error saving invoice', 'error');
+    if (e.status === 422) {
+      // The form changed since the failed attempt; the next submit is a new invoice
+      pendingInvoiceKey = null;
+    }
+    showNotification(`Error saving invoice: ${e.message}`, 'error');
   }
 };
 
 window.loadInvoices = async function () {
   try {
-    const querySnapshot = await getDocs(collection(window.firestoreDb, "invoices"));
+    if (!currentOrgId()) {
+      console.warn("No organization assigned yet; not loading invoices");
+      return;
+    }
+    const querySnapshot = await getDocs(query(collection(window.firestoreDb, "invoices"), where("orgId", "==", currentOrgId())));
     invoicesData = querySnapshot.docs.map(doc => ({ 
       id: doc.id, 
       docId: doc.id, // Keep Firestore document ID
@@ -405,7 +457,8 @@ window.deleteInvoice = async function (invoiceId) {
   try {
     const invoice = invoicesData.find(inv => inv.id === invoiceId || inv.docId === invoiceId);
     if (invoice && invoice.docId) {
-      await deleteDoc(doc(window.firestoreDb, "invoices", invoice.docId));
+      // Through the API so the organization's aging summary is updated in the same write
+      await apiRequest(`/invoices/${encodeURIComponent(invoice.docId)}`, { method: 'DELETE' });
       console.log("✅ Invoice deleted:", invoiceId);
       window.loadInvoices(); // Reload the list
       showNotification('Invoice deleted successfully', 'success');
@@ -416,6 +469,21 @@ window.deleteInvoice = async function (invoiceId) {
   }
 };
 
+// --- ARCHIVE ROLLUPS ---
+window.loadArchiveRollups = async function () {
+  try {
+    if (!currentOrgId()) return;
+    const querySnapshot = await getDocs(query(collectionGroup(window.firestoreDb, "rollups"), where("orgId", "==", currentOrgId())));
+    archiveRollups = querySnapshot.docs.map(doc => doc.data());
+    console.log("✅ Archive rollups loaded:", archiveRollups.length);
+    calculateFinancialMetrics();
+    updateMetrics(currentPeriod);
+    updateCharts(currentPeriod);
+  } catch (e) {
+    console.error("❌ Error loading archive rollups:", e);
+  }
+};
+
 // --- TRANSACTIONS ---
 window.saveTransaction = async function (transaction) {
   try {
@@ -429,7 +497,8 @@ window.saveTransaction = async function (transaction) {
       const docRef = await addDoc(collection(window.firestoreDb, "transactions"), {
         ...transaction,
         createdAt: new Date(),
-        category: currentTab
+        category: currentTab,
+        orgId: currentOrgId()
       });
       console.log("✅ Transaction saved with ID:", docRef.id);
     }
@@ -446,7 +515,11 @@ window.saveTransaction = async function (transaction) {
 
 window.loadTransactions = async function () {
   try {
-    const querySnapshot = await getDocs(collection(window.firestoreDb, "transactions"));
+    if (!currentOrgId()) {
+      console.warn("No organization assigned yet; not loading transactions");
+      return;
+    }
+    const querySnapshot = await getDocs(query(collection(window.firestoreDb, "transactions"), where("orgId", "==", currentOrgId())));
     const transactions = querySnapshot.docs.map(doc => ({ 
       id: doc.id,
       docId: doc.id,
@@ -672,7 +745,7 @@ function renderInvoiceTable() {
         const row = document.createElement('tr');
         row.className = 'border-b border-gray-100 hover:bg-gray-50';
         row.innerHTML = `
-            <td class="py-3 px-4 font-medium">${invoice.id || invoice.orderNo}</td>
+            <td class="py-3 px-4 font-medium">${invoice.invoiceNumber || invoice.orderNo || invoice.id}</td>
             <td class="py-3 px-4">${invoice.clientName}</td>
             <td class="py-3 px-4 font-semibold">${formatINR(invoice.grandTotal || invoice.amount || 0)}</td>
             <td class="py-3 px-4">
@@ -701,14 +774,24 @@ function renderInvoiceTable() {
     });
 }
 
-function changeInvoiceStatus(invoiceId, newStatus) {
+async function changeInvoiceStatus(invoiceId, newStatus) {
     const invoice = invoicesData.find(inv => inv.id === invoiceId);
     if (invoice) {
-        invoice.status = newStatus;
-        
-        // Save to Firebase
-        window.saveInvoice(invoice);
-        showNotification(`Invoice ${invoiceId} status changed to ${newStatus}`, 'success');
+        try {
+            // Only the status goes to the API, which moves the invoice in the aging summary
+            await apiRequest(`/invoices/${encodeURIComponent(invoiceId)}`, {
+                method: 'PUT',
+                body: JSON.stringify({ status: newStatus })
+            });
+            invoice.status = newStatus;
+            calculateFinancialMetrics();
+            updateMetrics(currentPeriod);
+            showNotification(`Invoice ${invoice.invoiceNumber || invoiceId} status changed to ${newStatus}`, 'success');
+        } catch (e) {
+            console.error("❌ Error changing invoice status:", e);
+            showNotification(`Error changing invoice status: ${e.message}`, 'error');
+            renderInvoiceTable(); // Put the dropdown back
+        }
     }
 }
 
@@ -721,7 +804,7 @@ function exportToExcel() {
         }
         
         const exportData = invoicesData.map(invoice => ({
-            'Invoice ID': invoice.id || invoice.orderNo || 'N/A',
+            'Invoice ID': invoice.invoiceNumber || invoice.orderNo || invoice.id || 'N/A',
             'Order No': invoice.orderNo || 'N/A',
             'Date': invoice.date || 'N/A',
             'Client Name': invoice.clientName || 'N/A',
@@ -841,6 +924,7 @@ function closeInvoiceModal() {
     const modal = document.getElementById('invoiceModal');
     modal.classList.add('hidden');
     currentEditingInvoiceId = null;
+    pendingInvoiceKey = null;
     resetInvoiceForm();
 }
 
@@ -1097,6 +1181,7 @@ function initApp() {
     // Load initial data
     window.loadInvoices();
     window.loadTransactions();
+    window.loadArchiveRollups(); // Totals of archived months, so archiving doesn't drop them from the dashboard
     window.loadUsers(); // Load users for admin panel
     
     // Setup event listeners
@@ -1150,7 +1235,7 @@ function setupEventListeners() {
             const grandTotal = parseFloat(document.getElementById('grandTotal').value) || 0;
             
             const invoiceData = {
-                id: currentEditingInvoiceId || `INV-${Date.now()}`,
+                id: currentEditingInvoiceId,
                 orderNo: document.getElementById('orderNo').value,
                 date: document.getElementById('invoiceDate').value,
                 orderId: document.getElementById('orderId').value,
@@ -1163,8 +1248,7 @@ function setupEventListeners() {
                 sgstRate: sgstRate,
                 cgstRate: cgstRate,
                 grandTotal: grandTotal,
-                status: currentEditingInvoiceId ? invoicesData.find(inv => inv.id === currentEditingInvoiceId)?.status || 'Pending' : 'Pending',
-                createdAt: new Date()
+                status: currentEditingInvoiceId ? invoicesData.find(inv => inv.id === currentEditingInvoiceId)?.status || 'Pending' : 'Pending'
             };
             
             window.saveInvoice(invoiceData);
@@ -1410,6 +1494,7 @@ async function handleUserFormSubmit(e) {
             // Create new user (initially pending)
             userData.status = "pending";
             userData.secretCode = "1234"; // Or generate/set server-side
+            userData.orgId = null; // Assigned by an admin; no data access until then
             userData.createdAt = new Date();
             const docRef = await addDoc(collection(window.firestoreDb, "users"), userData);
             console.log("✅ User created with ID:", docRef.id);
@@ -1434,7 +1519,7 @@ function renderInvoiceTable() {
         const row = document.createElement('tr');
         row.className = 'border-b border-gray-100 hover:bg-gray-50';
         row.innerHTML = `
-            <td class="px-6 py-4 font-medium text-gray-900">${invoice.id}</td>
+            <td class="px-6 py-4 font-medium text-gray-900">${invoice.invoiceNumber || invoice.id}</td>
             <td class="px-6 py-4">${invoice.clientName}</td>
             <td class="px-6 py-4 font-semibold">${formatINR(invoice.amount)}</td>
             <td class="px-6 py-4">
@@ -0,0 +1,29 @@
+import argparse
+
+import pytest
+
+from partitions import AUTO_ID_ALPHABET, MAX_PARTITIONS, id_range_bounds, partition_count
+
+
+def test_ranges_cover_the_keyspace_without_overlap():
+    bounds = id_range_bounds(16)
+    assert len(bounds) == 16
+    assert bounds[0][0] is None and bounds[-1][1] is None
+    assert all(end == start for (_, end), (start, _) in zip(bounds, bounds[1:]))
+
+
+def test_range_count_is_capped_at_the_id_alphabet():
+    assert MAX_PARTITIONS == len(AUTO_ID_ALPHABET)
+    assert len(id_range_bounds(100)) == MAX_PARTITIONS
+    assert len(id_range_bounds(0)) == 1
+
+
+@pytest.mark.parametrize('text', ['0', '63', '100'])
+def test_partition_count_rejects_counts_that_cannot_be_honoured(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        partition_count(text)
+
+
+def test_partition_count_accepts_the_full_range():
+    assert partition_count('1') == 1
+    assert partition_count(str(MAX_PARTITIONS)) == MAX_PARTITIONS
@@ -0,0 +1,96 @@
+import hashlib
+import threading
+
+import pytest
+
+import passwords
+from passwords import HasherBusy, PasswordHasher, format_hash, parse_hash
+
+# Cheap settings so the tests stay fast
+SCRYPT = ('scrypt', (1024, 1, 1))
+PBKDF2 = ('pbkdf2_sha256', (1000,))
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(*SCRYPT, workers=2, max_queue=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_round_trip(hasher):
+    stored = hasher.hash('s3cret')
+    assert stored.startswith('scrypt$1024$1$1$')
+    assert hasher.verify('s3cret', stored)
+    assert not hasher.verify('S3cret', stored)
+
+
+def test_hashes_are_salted(hasher):
+    assert hasher.hash('s3cret') != hasher.hash('s3cret')
+
+
+def test_verifies_hashes_made_with_other_settings(hasher):
+    other = PasswordHasher(*PBKDF2, workers=1)
+    try:
+        assert hasher.verify('s3cret', other.hash('s3cret'))
+    finally:
+        other.shutdown()
+
+
+def test_legacy_sha256_digest_is_verified(hasher):
+    legacy = hashlib.sha256(b's3cret').hexdigest()
+    assert hasher.verify('s3cret', legacy)
+    assert not hasher.verify('wrong', legacy)
+
+
+@pytest.mark.parametrize('stored', [None, 42, '', 'not-a-hash', 'scrypt$1$2', b'scrypt'])
+def test_unusable_stored_hashes_never_verify(hasher, stored):
+    assert hasher.verify('s3cret', stored) is False
+
+
+def test_parse_hash_rejects_non_strings():
+    with pytest.raises(ValueError):
+        parse_hash(None)
+
+
+def test_needs_rehash(hasher):
+    assert not hasher.needs_rehash(hasher.hash('s3cret'))
+    assert hasher.needs_rehash(hashlib.sha256(b's3cret').hexdigest())
+    assert hasher.needs_rehash(format_hash('scrypt', (2048, 1, 1), b'salt', b'key'))
+    assert hasher.needs_rehash(format_hash(*PBKDF2, b'salt', b'key'))
+    assert hasher.needs_rehash(None)
+    assert hasher.needs_rehash('garbage')
+
+
+def test_dummy_hash_uses_current_settings_and_is_reused(hasher):
+    dummy = hasher.dummy_hash()
+    assert not hasher.needs_rehash(dummy)
+    assert hasher.dummy_hash() is dummy
+    assert not hasher.verify('', dummy)
+
+
+def test_hasher_busy_when_pool_and_queue_are_full(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_derive(*args):
+        started.set()
+        release.wait(5)
+        return b'key'
+
+    monkeypatch.setattr(passwords, 'derive', blocking_derive)
+    # A single slot: one hash on the worker and no room to queue another
+    hasher = PasswordHasher(*SCRYPT, workers=1, max_queue=0)
+    running = threading.Thread(target=hasher.hash, args=('s3cret',))
+    try:
+        running.start()
+        assert started.wait(5)
+        with pytest.raises(HasherBusy):
+            hasher.hash('s3cret')
+        release.set()
+        running.join()
+        # The slot is given back once the hash finishes
+        assert hasher.verify('s3cret', format_hash(*SCRYPT, b'salt', b'key'))
+    finally:
+        release.set()
+        hasher.shutdown()
@@ -0,0 +1,32 @@
+from rate_limit import MemoryBucketStore, SQLiteBucketStore
+
+
+def test_bucket_refills_over_time():
+    store = MemoryBucketStore()
+    assert store.take('ip:a', 2, 1, now=0) == (True, 0)
+    assert store.take('ip:a', 2, 1, now=0) == (True, 0)
+    assert store.take('ip:a', 2, 1, now=0) == (False, 1)
+    assert store.take('ip:a', 2, 1, now=1)[0]
+
+
+def test_memory_store_keeps_at_most_max_keys():
+    store = MemoryBucketStore(max_keys=3)
+    for i in range(10):
+        store.take(f'email:{i}', 5, 5 / 60, now=i)
+    assert list(store._buckets) == ['email:7', 'email:8', 'email:9']
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryBucketStore(max_keys=2)
+    store.take('ip:a', 5, 1, now=0)
+    store.take('ip:b', 5, 1, now=0)
+    store.take('ip:a', 5, 1, now=0)
+    store.take('ip:c', 5, 1, now=0)
+    assert list(store._buckets) == ['ip:a', 'ip:c']
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.take('ip:a', 1, 1, now=100)[0]
+    assert not second.take('ip:a', 1, 1, now=100)[0]
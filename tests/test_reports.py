@@ -0,0 +1,127 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import reports
+from reports import aging_rows, apply_change, flatten_line_items, format_rate, gst_summary, iter_csv
+
+
+def invoice(sgst, cgst, *items):
+    return {'sgstRate': sgst, 'cgstRate': cgst,
+            'items': [{'hsnCode': hsn, 'quantity': qty, 'amount': amount} for hsn, qty, amount in items]}
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def reducer(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(reports, 'np', None)
+    elif reports.np is None:
+        pytest.skip('numpy not installed')
+    return request.param
+
+
+@pytest.mark.parametrize('value, expected', [
+    (10, '10'), (9, '9'), ('2.50', '2.5'), (0, '0'), (None, '0'), (100, '100'), ('14.00', '14'),
+])
+def test_format_rate_is_plain_decimal(value, expected):
+    assert format_rate(value) == expected
+
+
+def test_flatten_line_items_groups_by_hsn_and_rates():
+    groups, codes, quantity, paise = flatten_line_items([
+        invoice(9, 9, ('998311', 2, 100.005), ('', 1, 50)),
+        invoice(10, 10, ('998311', 3, '10.10')),
+    ])
+    assert groups == [('998311', '9', '9'), ('UNSPECIFIED', '9', '9'), ('998311', '10', '10')]
+    assert codes == [0, 1, 2]
+    assert quantity == [2.0, 1.0, 3.0]
+    assert paise == [10001, 5000, 1010]
+
+
+def test_gst_summary_sums_groups_and_rounds_tax(reducer):
+    rows = gst_summary([
+        invoice(9, 9, ('998311', 1, '100.05'), ('998311', 2, '0.10')),
+        invoice(9, 9, ('998311', 1, '0.01')),
+        invoice(10, 10, ('847130', 4, '1000')),
+    ])
+    assert [(r['hsnCode'], r['sgstRate'], r['cgstRate']) for r in rows] == [
+        ('847130', Decimal('10'), Decimal('10')), ('998311', Decimal('9'), Decimal('9'))]
+    high, low = rows
+    assert str(high['sgstRate']) == '10'
+    assert high['lineItems'] == 1 and high['quantity'] == 4
+    assert high['taxableValue'] == Decimal('1000.00')
+    assert high['totalTax'] == Decimal('200.00')
+    assert low['lineItems'] == 3 and low['quantity'] == 4
+    assert low['taxableValue'] == Decimal('100.16')
+    # 9% of 100.16 = 9.0144 -> 9.01 per half
+    assert low['sgstAmount'] == low['cgstAmount'] == Decimal('9.01')
+    assert low['totalTax'] == Decimal('18.02')
+
+
+def test_gst_summary_without_line_items_is_empty():
+    assert gst_summary([]) == []
+    assert gst_summary([{'sgstRate': 9, 'cgstRate': 9}]) == []
+
+
+def test_iter_csv_writes_header_and_plain_rates():
+    rows = gst_summary([invoice(10, 10, ('998311', 1, '50'))])
+    text = ''.join(iter_csv(rows))
+    parsed = list(csv.DictReader(io.StringIO(text)))
+    assert text.splitlines()[0] == ','.join(reports.GST_COLUMNS)
+    assert parsed == [{'hsnCode': '998311', 'sgstRate': '10', 'cgstRate': '10', 'lineItems': '1',
+                       'quantity': '1.0', 'taxableValue': '50.00', 'sgstAmount': '5.00',
+                       'cgstAmount': '5.00', 'totalTax': '10.00'}]
+    assert '1E+1' not in text
+
+
+def test_iter_csv_streams_in_chunks():
+    rows = [dict.fromkeys(reports.GST_COLUMNS, 1)] * 2500
+    chunks = list(iter_csv(rows))
+    assert len(chunks) == 3
+    assert sum(chunk.count('\n') for chunk in chunks) == 2501
+
+
+def receivable(client, due, amount, status='Pending'):
+    return {'clientName': client, 'dueDate': due, 'grandTotal': amount, 'status': status}
+
+
+def test_apply_change_tracks_unpaid_invoices_by_client_and_due_date():
+    entries = {}
+    apply_change(entries, None, receivable('Acme', '2026-09-01', '100.10'))
+    apply_change(entries, None, receivable('Acme', '2026-09-01', 50))
+    apply_change(entries, None, receivable('Acme', '2026-09-01', 75, status='Paid'))
+    assert list(entries.values()) == [{'clientName': 'Acme', 'dueDate': '2026-09-01', 'amount': 15010, 'invoices': 2}]
+
+
+def test_apply_change_moves_and_removes_invoices():
+    entries = {}
+    pending = receivable('Acme', '2026-09-01', 100)
+    apply_change(entries, None, pending)
+    moved = dict(pending, dueDate='2026-10-01')
+    apply_change(entries, pending, moved)
+    assert [e['dueDate'] for e in entries.values()] == ['2026-10-01']
+    # Paying the invoice removes it from the summary entirely
+    apply_change(entries, moved, dict(moved, status='Paid'))
+    assert entries == {}
+    apply_change(entries, None, pending)
+    apply_change(entries, pending, None)
+    assert entries == {}
+
+
+def test_aging_rows_buckets_by_days_past_due():
+    entries = {}
+    for client, due, amount in [('Acme', '2026-10-25', 10), ('Acme', '2026-10-19', 20),
+                                ('Acme', '2026-08-01', '30.05'), ('Zen', '2026-01-01', 40)]:
+        apply_change(entries, None, receivable(client, due, amount))
+    report = aging_rows(entries, date(2026, 10, 19))
+    assert report['buckets'] == ['current', '0-30', '31-60', '61-90', '90+']
+    acme, zen = report['clients']
+    assert acme['clientName'] == 'Acme' and acme['invoices'] == 3
+    assert (acme['current'], acme['0-30'], acme['61-90']) == (Decimal('10.00'), Decimal('20.00'), Decimal('30.05'))
+    assert acme['total'] == Decimal('60.05')
+    assert zen['90+'] == Decimal('40.00')
+    assert report['totals']['total'] == Decimal('100.05')
+    assert report['totals']['invoices'] == 4
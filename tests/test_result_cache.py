@@ -0,0 +1,115 @@
+import threading
+import time
+
+from result_cache import DiskCacheBackend, MemoryCacheBackend, ResultCache
+
+
+def make_cache(**kwargs):
+    return ResultCache(MemoryCacheBackend(), ttl_seconds=60, lock_seconds=5, **kwargs)
+
+
+class Counter:
+    def __init__(self, value=b'body', delay=0):
+        self.value, self.delay, self.calls = value, delay, 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+def test_hit_after_compute():
+    cache, compute = make_cache(), Counter()
+    assert cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute) == (b'body', False)
+    assert cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute) == (b'body', True)
+    assert compute.calls == 1
+    assert cache.metrics()['hits'] == 1 and cache.metrics()['misses'] == 1
+
+
+def test_keys_are_per_organization_and_request():
+    cache, compute = make_cache(), Counter()
+    cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute)
+    cache.get_or_compute(('invoices',), 'zen', ('/api/invoices',), compute)
+    cache.get_or_compute(('invoices',), 'acme', ('/api/invoices', [('from', '2026-04-01')]), compute)
+    assert compute.calls == 3
+
+
+def test_miss_after_invalidate():
+    cache, compute = make_cache(), Counter()
+    cache.get_or_compute(('invoices', 'archive'), 'acme', ('/api/invoices',), compute)
+    cache.invalidate(['invoices'], 'acme')
+    assert cache.get_or_compute(('invoices', 'archive'), 'acme', ('/api/invoices',), compute) == (b'body', False)
+    assert compute.calls == 2
+
+
+def test_invalidating_all_organizations_reaches_every_one():
+    cache, compute = make_cache(), Counter()
+    cache.get_or_compute(('archive',), 'acme', ('/api/archive/rollups',), compute)
+    cache.invalidate(['archive'])
+    cache.get_or_compute(('archive',), 'acme', ('/api/archive/rollups',), compute)
+    assert compute.calls == 2
+
+
+def test_invalidating_another_collection_or_organization_keeps_entries():
+    cache, compute = make_cache(), Counter()
+    cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute)
+    cache.invalidate(['transactions'], 'acme')
+    cache.invalidate(['invoices'], 'zen')
+    assert cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute)[1] is True
+
+
+def test_uncacheable_result_is_not_stored():
+    # compute() returns None for non-200 responses
+    cache, compute = make_cache(), Counter(value=None)
+    assert cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute) == (None, False)
+    assert cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute) == (None, False)
+    assert compute.calls == 2
+
+
+def test_concurrent_requests_for_one_key_compute_once():
+    cache, compute = make_cache(), Counter(delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        cache.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert compute.calls == 1
+    assert sorted(hit for _, hit in results) == [False] + [True] * 9
+    assert all(value == b'body' for value, _ in results)
+
+
+def test_slow_key_does_not_block_other_keys():
+    cache, slow = make_cache(), Counter(delay=0.5)
+    thread = threading.Thread(target=cache.get_or_compute, args=(('invoices',), 'acme', ('slow',), slow))
+    thread.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    for i in range(50):
+        cache.get_or_compute(('invoices',), 'acme', ('fast', i), Counter())
+    assert time.monotonic() - started < 0.25
+    thread.join()
+
+
+def test_uncacheable_result_lets_waiters_compute_their_own():
+    cache, compute = make_cache(), Counter(value=None, delay=0.1)
+    threads = [threading.Thread(target=cache.get_or_compute, args=(('invoices',), 'acme', ('/x',), compute))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert compute.calls == 3
+
+
+def test_disk_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = ResultCache(DiskCacheBackend(path), ttl_seconds=60)
+    second = ResultCache(DiskCacheBackend(path), ttl_seconds=60)
+    compute = Counter()
+    first.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute)
+    assert second.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute) == (b'body', True)
+    second.invalidate(['invoices'], 'acme')
+    assert first.get_or_compute(('invoices',), 'acme', ('/api/invoices',), compute)[1] is False
+    assert compute.calls == 2